@@ -1,13 +1,10 @@
 
 from ingredient_parser import parse
+from recipe_reader import iter_recipes
 
-import pandas as pd
-
-df = pd.read_json("recipes_raw_nosource_ar.json")
-df = df.transpose()
 cnt = 0
-for index, row in df.iterrows():
-    for i in row["ingredients"]:
+for index, title, ingredients in iter_recipes("recipes_raw_nosource_ar.json"):
+    for i in ingredients or []:
         print(i)
     cnt+=1
     if cnt > 3:
@@ -1,7 +1,12 @@
+from columnar import ColumnarBuilder
+from error_sink import ErrorSink
+from units import normalize_units
+
 test_df = df.transpose().head(100)
-ingredient_df = pd.DataFrame(
-    columns=["title", "amount", "unit", "ingredient", "comment"]
-)
+# parsed ingredients are collected column by column and turned into a frame once
+ingredient_columns = ColumnarBuilder()
+# cans and packages without a size are collected here instead of printed
+parse_errors = ErrorSink()
 for index, row in test_df.iterrows():
     if isinstance(row["ingredients"], list):
         ingredients = []
@@ -126,14 +131,18 @@ for index, row in test_df.iterrows():
 
             # convert cans and packages to standard measure
             if unitString == "cans" or unitString == "packages":
-                print(ingredient)
+                sized = False
                 for i in ingredient["descriptions"]:
                     desc = i.split()
-                    print(desc, is_number(desc[0]))
                     if len(desc) == 2 and is_number(desc[0]):
                         # desciption is the quantity and unit of can
                         ingredient["amount"] *= float(desc[0])
                         unitString = inCheckingPlurals(desc[1], measurementUnits)
+                        sized = True
+                if not sized:
+                    parse_errors.add(
+                        "container_size", row.name, row["title"], ingredientString
+                    )
 
             ingredient["unit"] = unitString
 
@@ -273,41 +282,20 @@ for index, row in test_df.iterrows():
             ingredient["ingredient"] = ingredientString
 
             # print(ingredient)
-            ingredient_df = ingredient_df.append(
-                {
-                    "title": row["title"],
-                    "amount": ingredient["amount"],
-                    "unit": ingredient["unit"],
-                    "ingredient": ingredient["ingredient"],
-                },
-                ignore_index=True,
+            ingredient_columns.append(
+                row["title"],
+                ingredient["amount"],
+                ingredient["unit"],
+                ingredient["ingredient"],
+                ingredient["descriptions"],
             )
 
-ingredient_df.loc[ingredient_df.unit == "pounds", ["amount", "unit"]] = (
-    ingredient_df.loc[ingredient_df.unit == "pounds"]["amount"] * 453.592,
-    "gram",
-)
-ingredient_df.loc[ingredient_df.unit == "teaspoons", ["amount", "unit"]] = (
-    ingredient_df.loc[ingredient_df.unit == "teaspoons"]["amount"] * 4.92892,
-    "ml",
-)
-ingredient_df.loc[ingredient_df.unit == "tablespoons", ["amount", "unit"]] = (
-    ingredient_df.loc[ingredient_df.unit == "tablespoons"]["amount"] * 14.7868,
-    "ml",
-)
-ingredient_df.loc[ingredient_df.unit == "cups", ["amount", "unit"]] = (
-    ingredient_df.loc[ingredient_df.unit == "cups"]["amount"] * 236.588,
-    "ml",
-)
-ingredient_df.loc[ingredient_df.unit == "pinches", ["amount", "unit"]] = (
-    ingredient_df.loc[ingredient_df.unit == "pinches"]["amount"] * 4.92892 * (1 / 16),
-    "ml",
-)
-ingredient_df.loc[ingredient_df.unit == "dashes", ["amount", "unit"]] = (
-    ingredient_df.loc[ingredient_df.unit == "dashes"]["amount"] * 4.92892 * (1 / 8),
-    "ml",
-)
-ingredient_df.loc[ingredient_df.unit == "ounces", ["amount", "unit"]] = (
-    ingredient_df.loc[ingredient_df.unit == "ounces"]["amount"] * 28.3495,
-    "gram",
+ingredient_df = ingredient_columns.to_dataframe()
+parse_errors.log_summary()
+
+# convert every known unit to gram or ml in one pass over the frame, keeping
+# this script's unit labels and a plain object column
+ingredient_df = normalize_units(
+    ingredient_df, base_units={"mass": "gram", "volume": "ml"}
 )
+ingredient_df["unit"] = ingredient_df["unit"].astype(object)
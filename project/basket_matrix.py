@@ -0,0 +1,177 @@
+"""
+This module contains the recipe x ingredient incidence matrix the mining code
+starts from. Ingredient names are interned into integer ids once, and the
+ingredients of every recipe are stored as sorted ids in CSR form (indptr and
+indices arrays). A matrix is saved as .npy files plus a JSON vocabulary, and
+loaded memory-mapped, so it is ready without parsing or grouping anything.
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+class BasketMatrix:
+    """
+    The ingredients of recipe row r are the ids indices[indptr[r]:indptr[r + 1]],
+    in increasing order and without repeats. recipes[r] is the index of that
+    recipe in the parsed output, vocabulary[i] the name of ingredient id i and
+    name_ids the reverse mapping.
+    """
+
+    def __init__(self, indptr, indices, recipes, vocabulary):
+        self.indptr = indptr
+        self.indices = indices
+        self.recipes = recipes
+        self.vocabulary = vocabulary
+        self.name_ids = {name: item for item, name in enumerate(vocabulary)}
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """
+        Builds the matrix from an iterable of (recipe index, ingredient name)
+        pairs in one pass. Recipes and names are numbered in order of first
+        appearance. Missing names are skipped, a recipe without any name gets
+        an empty row, so there is one row per recipe like in baskets_from_frame
+        and support thresholds are taken over the same number of recipes
+        """
+        recipe_rows = {}
+        name_ids = {}
+        rows = []
+        columns = []
+        for recipe, name in pairs:
+            row = recipe_rows.get(recipe)
+            if row is None:
+                row = recipe_rows[recipe] = len(recipe_rows)
+            if not isinstance(name, str):
+                continue
+            item = name_ids.get(name)
+            if item is None:
+                item = name_ids[name] = len(name_ids)
+            rows.append(row)
+            columns.append(item)
+
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int32)
+        # sort by row then id and drop repeated ingredients of a recipe
+        order = np.lexsort((columns, rows))
+        rows = rows[order]
+        columns = columns[order]
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+        rows = rows[keep]
+        columns = columns[keep]
+
+        indptr = np.zeros(len(recipe_rows) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(recipe_rows)), out=indptr[1:])
+        return cls(indptr, columns, list(recipe_rows), list(name_ids))
+
+    @classmethod
+    def from_frame(cls, frame, column="name"):
+        """
+        Builds the matrix from a frame of parsed ingredients indexed by recipe
+        (i.e. basket_parsed.pickle or the parsed ingredient frame)
+        """
+        if not hasattr(frame, "columns"):
+            frame = frame.to_frame(column)
+        return cls.from_pairs(zip(frame.index.get_level_values(0), frame[column]))
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, len(self.vocabulary)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def row(self, row):
+        """
+        Returns the ingredient ids of a recipe row
+        """
+        return self.indices[self.indptr[row] : self.indptr[row + 1]]
+
+    def baskets(self, names=False):
+        """
+        Returns the list of baskets, one frozenset of ingredient ids per recipe
+        (or of names), ready for the miners of itemsets
+        """
+        indices = self.indices.tolist()
+        indptr = self.indptr.tolist()
+        if names:
+            vocabulary = self.vocabulary
+            return [
+                frozenset(vocabulary[item] for item in indices[start:end])
+                for start, end in zip(indptr, indptr[1:])
+            ]
+        return [frozenset(indices[start:end]) for start, end in zip(indptr, indptr[1:])]
+
+    def names(self, items):
+        """
+        Returns the names of ingredient ids, i.e. of a mined itemset
+        """
+        return [self.vocabulary[item] for item in items]
+
+    def ids(self, names):
+        """
+        Returns the ids of ingredient names
+        """
+        return [self.name_ids[name] for name in names]
+
+    def item_counts(self):
+        """
+        Returns the number of recipes of every ingredient id
+        """
+        return np.bincount(self.indices, minlength=len(self.vocabulary))
+
+    def item_rows(self):
+        """
+        Returns the transposed (CSC) form, an (indptr, rows) pair where the rows
+        of ingredient id i are rows[indptr[i]:indptr[i + 1]], in order
+        """
+        rows = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind="stable")
+        indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(self.item_counts(), out=indptr[1:])
+        return indptr, rows[order]
+
+    def to_scipy(self):
+        """
+        Returns the matrix as a scipy.sparse csr_matrix of ones
+        """
+        from scipy.sparse import csr_matrix
+
+        data = np.ones(len(self.indices), dtype=np.int8)
+        return csr_matrix((data, self.indices, self.indptr), shape=self.shape)
+
+    def save(self, directory):
+        """
+        Saves the matrix to a directory, as indptr.npy, indices.npy and a JSON
+        file with the recipes and the vocabulary
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "indptr.npy"), self.indptr)
+        np.save(os.path.join(directory, "indices.npy"), self.indices)
+        with open(os.path.join(directory, "vocabulary.json"), "w", encoding="utf-8") as file:
+            json.dump(
+                {"recipes": _json_values(self.recipes), "vocabulary": self.vocabulary},
+                file,
+                ensure_ascii=False,
+            )
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Loads a matrix saved with save(), the arrays are memory-mapped unless
+        mmap is False
+        """
+        mmap_mode = "r" if mmap else None
+        indptr = np.load(os.path.join(directory, "indptr.npy"), mmap_mode=mmap_mode)
+        indices = np.load(os.path.join(directory, "indices.npy"), mmap_mode=mmap_mode)
+        with open(os.path.join(directory, "vocabulary.json"), encoding="utf-8") as file:
+            names = json.load(file)
+        return cls(indptr, indices, names["recipes"], names["vocabulary"])
+
+
+def _json_values(values):
+    # recipe indexes come out of numpy arrays as numpy scalars
+    return [value.item() if isinstance(value, np.generic) else value for value in values]
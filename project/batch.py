@@ -0,0 +1,113 @@
+"""
+This module contains the batch entry point for parsing many recipes at once on
+several cores, and the ordered pool map it is built on.
+"""
+
+import os
+from collections import deque
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+
+import util
+from error_sink import ErrorSink
+from util import parse_ingredient_list
+
+
+def parse_recipes(recipes, workers=None, chunksize=256, parser=parse_ingredient_list):
+    """
+    Parses an iterable of (recipe_index, recipe_title, ingredient_list) tuples and
+    yields parser(recipe_index, recipe_title, ingredient_list) for each of them,
+    in the same order. Recipes are sent to a pool of worker processes in chunks
+    and results are yielded as soon as the chunks before them are done. Only a
+    few chunks per worker are in flight, so recipes can come from a generator.
+    workers defaults to the number of cores; with 1 worker no pool is started.
+    With a persistent store behind util.PARSE_CACHE, workers read it through
+    their own connections and send the lines they parsed back with every chunk,
+    so only this process writes to it. The parse errors of the workers are
+    merged into util.ERROR_SINK the same way.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    recipes = iter(recipes)
+
+    if workers <= 1:
+        for recipe in recipes:
+            yield parser(*recipe)
+        return
+
+    store = util.PARSE_CACHE.store
+    if store is not None:
+        store.flush()
+    chunks = _imap_chunks(
+        _parse_chunk, recipes, workers, chunksize, _init_worker, (parser, store)
+    )
+    for parsed, stored, errors in chunks:
+        if stored:
+            store.put_pending(stored)
+        util.ERROR_SINK.merge(errors)
+        yield from parsed
+
+
+def imap_ordered(function, items, workers=None, chunksize=256):
+    """
+    Yields function(item) for every item of an iterable, in the same order. Items
+    are sent to a pool of worker processes in chunks, with only a few chunks per
+    worker in flight, so items can come from a generator. function must be
+    defined at the top level of a module. workers defaults to the number of
+    cores; with 1 worker no pool is started.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        yield from map(function, items)
+        return
+    for results in _imap_chunks(partial(_map_chunk, function), items, workers, chunksize):
+        yield from results
+
+
+def _imap_chunks(function, items, workers, chunksize, initializer=None, initargs=()):
+    """
+    Yields function(chunk) for consecutive chunks of items, in order, computed by
+    a pool of workers with at most workers * 4 chunks in flight
+    """
+    items = iter(items)
+    max_pending = workers * 4
+    with Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        while True:
+            chunk = list(islice(items, chunksize))
+            if chunk:
+                pending.append(pool.apply_async(function, (chunk,)))
+            if pending and (not chunk or len(pending) >= max_pending):
+                yield pending.popleft().get()
+            elif not chunk:
+                break
+
+
+def _map_chunk(function, chunk):
+    return [function(item) for item in chunk]
+
+
+def _init_worker(parser, store):
+    global _parser
+    _parser = parser
+    # new entries are kept until the end of each chunk and written by the parent
+    if store is not None:
+        store = store.reopen(batch_size=float("inf"))
+    util.PARSE_CACHE.store = store
+    # errors are taken after each chunk and merged by the parent
+    sink = util.ERROR_SINK
+    util.ERROR_SINK = ErrorSink(
+        sink.max_examples, sink.quarantine, batch_size=float("inf")
+    )
+
+
+def _parse_chunk(chunk):
+    parsed = [_parser(*recipe) for recipe in chunk]
+    store = util.PARSE_CACHE.store
+    stored = store.take_pending() if store is not None else {}
+    return parsed, stored, util.ERROR_SINK.take()
+
+
+_parser = parse_ingredient_list
@@ -0,0 +1,352 @@
+"""
+This module contains benchmarks of the ingredient parser entry points. Every
+benchmark runs over a synthetic corpus of ingredient lines built from the lookup
+tables of util (or over the lines of a file) and reports lines per second, the
+p50 and p99 latency per line and the memory allocated while parsing:
+
+    python bench.py --scale 1m --output results.json
+    python bench.py --scale 1m --baseline results.json
+
+With --baseline, benchmarks that got slower than the baseline by more than the
+tolerance are listed and the exit status is 1. With --stages, the time spent in
+each stage of util.parse_ingredient is written as collapsed stacks, which flame
+graph tools (i.e. flamegraph.pl or speedscope) can draw.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from itertools import islice
+
+import numpy as np
+
+import ingredient_parser
+import util
+import utils
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# ingredient names are not part of the lookup tables, these are common ones
+INGREDIENT_NAMES = [
+    "all-purpose flour",
+    "white sugar",
+    "brown sugar",
+    "salt",
+    "black pepper",
+    "butter",
+    "olive oil",
+    "vegetable oil",
+    "milk",
+    "heavy cream",
+    "eggs",
+    "garlic",
+    "onion",
+    "green onions",
+    "celery",
+    "carrots",
+    "potatoes",
+    "tomatoes",
+    "black beans",
+    "chicken breast halves",
+    "ground beef",
+    "bacon",
+    "Cheddar cheese",
+    "Parmesan cheese",
+    "cream cheese",
+    "chicken broth",
+    "condensed cream of mushroom soup",
+    "baking powder",
+    "baking soda",
+    "vanilla extract",
+    "ground cinnamon",
+    "fresh parsley",
+    "lemon juice",
+    "soy sauce",
+    "Dijon mustard",
+    "honey",
+    "rice",
+    "linguine pasta",
+    "French bread",
+    "walnuts",
+]
+
+# how a line is put together, {amount} and {number} are quantities
+TEMPLATES = [
+    "{amount} {unit} {name}",
+    "{amount} {unit} {description} {name}",
+    "{amount} {unit} {name}, {description}",
+    "{amount} {unit} {name}, {adverb} {description}",
+    "{number} ({amount} {unit}) {container} {name}",
+    "{number} {container} {name}, {description}",
+    "{amount} {unit} {name} ({optional})",
+    "{amount} {unit} {name} {preposition} {description} {name}",
+    "{amount} to {amount} {unit} {name}",
+    "{amount} {unit} + {amount} {unit} {name}",
+    "{amount} {unit_abbreviation} {name}",
+    "{number} {name}",
+    "{name} to taste",
+    "For the {name}:",
+]
+
+
+def synthetic_lines(count, seed=0):
+    """
+    Yields count realistic ingredient lines, the same ones for the same seed
+    """
+    rng = random.Random(seed)
+    units = util.MEASUREMENT_UNITS
+    abbreviations = [
+        spelling for spellings in util.UNIT_ABREVIATIONS.values() for spelling in spellings
+    ]
+    vulgar_fractions = list(util.VULGAR_FRACTIONS)
+    fractions = ["1/2", "1/3", "2/3", "1/4", "3/4", "1/8"]
+
+    def number():
+        return str(rng.choice([1, 1, 1, 2, 2, 3, 4, 6, 8, 12]))
+
+    def amount():
+        kind = rng.random()
+        if kind < 0.5:
+            return number()
+        if kind < 0.7:
+            return rng.choice(fractions)
+        if kind < 0.85:
+            return number() + " " + rng.choice(fractions)
+        if kind < 0.95:
+            return rng.choice(vulgar_fractions)
+        return "{:.1f}".format(rng.uniform(0.1, 10))
+
+    for _ in range(count):
+        yield rng.choice(TEMPLATES).format_map(_Fields({
+            "amount": amount,
+            "number": number,
+            "unit": lambda: _singular(rng.choice(units)) if rng.random() < 0.3 else rng.choice(units),
+            "unit_abbreviation": lambda: rng.choice(abbreviations),
+            "container": lambda: rng.choice(util.CONTAINERS),
+            "description": lambda: rng.choice(util.DESCRIPTIONS),
+            "adverb": lambda: rng.choice(util.PRECEDING_ADVERBS),
+            "preposition": lambda: rng.choice(util.PREPOSITIONS),
+            "optional": lambda: rng.choice(util.OPTIONAL_STRINGS),
+            "name": lambda: rng.choice(INGREDIENT_NAMES),
+        }))
+
+
+class _Fields(dict):
+    """
+    Template fields that draw a new value every time they are used
+    """
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, key)()
+
+
+def _singular(unit):
+    if unit.endswith(("ches", "shes", "xes")):
+        return unit[:-2]
+    return unit[:-1]
+
+
+def _stage_input(line):
+    tokens = util.split_ingredient_words(util.SEPARATOR_REWRITER.apply(line))
+    ingredient = {"index": 0, "title": "bench", "amount": 0, "unit": None, "descriptions": []}
+    return tokens, ingredient
+
+
+def _line(line):
+    return (line,)
+
+
+def _tokens(line):
+    return (utils.tokenize(utils.cleanUnicodeFractions(line)),)
+
+
+def _get_features(tokens):
+    for index, token in enumerate(tokens, 1):
+        utils.getFeatures(token, index, tokens)
+
+
+def _crf_output(line):
+    """
+    Returns the lines crf_test -v 1 would print for a line, with tags from a
+    few simple rules
+    """
+    tokens = utils.tokenize(utils.cleanUnicodeFractions(line))
+    rows = ["# 0.500000\n"]
+    previous = None
+    for token, features in zip(tokens, utils.getSentenceFeatures(tokens)):
+        if util.parse_quantity(utils.unclump(token)) is not None:
+            tag = "QTY"
+        elif util.in_checking_plurals(token, util.MEASUREMENT_LEXICON):
+            tag = "UNIT"
+        elif token == "," or previous == "COMMENT":
+            tag = "COMMENT"
+        else:
+            tag = "NAME"
+        label = ("I-" if tag == previous else "B-") + tag + "/0.900000"
+        rows.append(utils.joinLine([token] + features + [label]) + "\n")
+        previous = tag
+    rows.append("\n")
+    return (rows,)
+
+
+def _import_data(rows):
+    for _ in utils.iter_import_data(rows):
+        pass
+
+
+# name -> (prepare, function), only function(*prepare(line)) is timed
+BENCHMARKS = {
+    "util.parse_ingredient_list": (
+        lambda line: (0, "bench", [line]),
+        util.parse_ingredient_list,
+    ),
+    "util.get_ingredient_amount": (_stage_input, util.get_ingredient_amount),
+    "util.get_ingredient_unit": (_stage_input, util.get_ingredient_unit),
+    "util.get_ingredient_descriptions": (_stage_input, util.get_ingredient_descriptions),
+    "util.get_ingredient": (_stage_input, util.get_ingredient),
+    "ingredient_parser.parse": (_line, ingredient_parser.parse),
+    "utils.cleanUnicodeFractions": (_line, utils.cleanUnicodeFractions),
+    "utils.tokenize": (_line, utils.tokenize),
+    "utils.getFeatures": (_tokens, _get_features),
+    "utils.getSentenceFeatures": (_tokens, utils.getSentenceFeatures),
+    "utils.export_data": (lambda line: ([line],), utils.export_data),
+    "utils.iter_import_data": (_crf_output, _import_data),
+}
+
+
+def run_benchmark(prepare, function, lines, alloc_lines=10_000):
+    """
+    Times function(*prepare(line)) for every line and then traces the memory
+    allocated over the first alloc_lines lines. Returns a dict with the results
+    """
+    latencies = array("d")
+    clock = time.perf_counter
+    for line in lines():
+        arguments = prepare(line)
+        started = clock()
+        function(*arguments)
+        latencies.append(clock() - started)
+
+    sample = [prepare(line) for line in islice(lines(), alloc_lines)]
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for arguments in sample:
+        function(*arguments)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.frombuffer(latencies, np.float64)
+    seconds = float(latencies.sum())
+    p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0.0, 0.0)
+    return {
+        "lines": len(latencies),
+        "seconds": seconds,
+        "lines_per_second": len(latencies) / seconds if seconds else 0.0,
+        "p50_us": float(p50) * 1e6,
+        "p99_us": float(p99) * 1e6,
+        "peak_bytes": peak - before,
+        "retained_bytes": after - before,
+    }
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Returns the list of (name, ratio) of the benchmarks whose lines per second
+    dropped below (1 - tolerance) times the baseline
+    """
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if not previous or not previous["lines_per_second"]:
+            continue
+        ratio = result["lines_per_second"] / previous["lines_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description="Benchmarks the ingredient parsers")
+    arguments.add_argument("--scale", choices=SCALES, default="10k")
+    arguments.add_argument("--lines", type=int, help="number of lines, overrides --scale")
+    arguments.add_argument("--input", help="file of ingredient lines to use instead")
+    arguments.add_argument("--seed", type=int, default=0)
+    arguments.add_argument("--only", action="append", help="benchmarks to run")
+    arguments.add_argument("--no-cache", action="store_true", help="disable PARSE_CACHE")
+    arguments.add_argument("--alloc-lines", type=int, default=10_000)
+    arguments.add_argument("--output", help="JSON file to save the results to")
+    arguments.add_argument("--baseline", help="JSON results to compare against")
+    arguments.add_argument("--tolerance", type=float, default=0.1)
+    arguments.add_argument("--stages", help="file to write the parse stage stacks to")
+    arguments = arguments.parse_args(argv)
+
+    if arguments.input:
+        with open(arguments.input, encoding="utf-8") as lines_file:
+            corpus = [line.rstrip("\n") for line in lines_file]
+        count = len(corpus)
+
+        def lines():
+            return iter(corpus)
+    else:
+        count = arguments.lines or SCALES[arguments.scale]
+
+        def lines():
+            return synthetic_lines(count, arguments.seed)
+
+    results = {
+        "input": arguments.input or "synthetic",
+        "lines": count,
+        "seed": arguments.seed,
+        "cache": not arguments.no_cache,
+        "python": platform.python_version(),
+        "benchmarks": {},
+    }
+    for name, (prepare, function) in BENCHMARKS.items():
+        if arguments.only and name not in arguments.only:
+            continue
+        util.PARSE_CACHE.clear()
+        util.PARSE_CACHE.configure(enabled=not arguments.no_cache)
+        result = run_benchmark(prepare, function, lines, arguments.alloc_lines)
+        results["benchmarks"][name] = result
+        print(
+            "{:<34}{:>12,.0f} lines/s  p50 {:>8.2f} us  p99 {:>8.2f} us  "
+            "peak {:>10,} B".format(
+                name,
+                result["lines_per_second"],
+                result["p50_us"],
+                result["p99_us"],
+                result["peak_bytes"],
+            )
+        )
+
+    if arguments.stages:
+        # a separate pass, so the stage timers do not slow down the benchmarks
+        util.PARSE_CACHE.clear()
+        util.PARSE_CACHE.configure(enabled=not arguments.no_cache)
+        with util.collect_stage_stats() as stats:
+            for line in lines():
+                util.parse_ingredient_list(0, "bench", [line])
+        with open(arguments.stages, "w") as stages_file:
+            stats.write_collapsed(stages_file)
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), arguments.tolerance)
+        for name, ratio in regressions:
+            print("regression: {} runs at {:.0%} of the baseline".format(name, ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""
+This module contains caches for parsed ingredient lines. Recipe corpora repeat the
+same lines ("1 teaspoon salt") very often, so a parsed line is kept and reused,
+in memory and optionally on disk across runs.
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A bounded least recently used cache with hit, miss and eviction counters.
+    Values should be immutable (i.e. tuples), callers copy them into fresh records
+    so a cached value is never changed by its users.
+    """
+
+    def __init__(self, maxsize=65536, enabled=True, store=None):
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.store = store
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, or default if there is none
+        """
+        if not self.enabled:
+            return default
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Caches value for key, evicting the least recently used entries if full
+        """
+        if not self.enabled or self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_parse(self, key, parse):
+        """
+        Returns the value cached for key. On a miss the persistent store is
+        checked, if there is one, before calling parse(key)
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            if self.store is not None:
+                value = self.store.get(key, _MISSING)
+            if value is _MISSING:
+                value = parse(key)
+                if self.store is not None:
+                    self.store.put(key, value)
+            self.put(key, value)
+        return value
+
+    def configure(self, maxsize=None, enabled=None):
+        """
+        Changes the size or switches the cache on or off. Switching it off or
+        shrinking it drops the entries that no longer fit
+        """
+        if enabled is not None:
+            self.enabled = enabled
+            if not enabled:
+                self._entries.clear()
+        if maxsize is not None:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops all entries and resets the counters
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a dict with the hit, miss and eviction counts and the hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "enabled": self.enabled,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SQLiteParseCache:
+    """
+    A persistent cache of parsed lines in an sqlite file. Entries are keyed by
+    the hash of the line and stored under a namespace (one per parser, i.e.
+    "rules" or "crf") and the fingerprint of that parser's version. Changing a
+    parser changes its fingerprint, so only its own entries stop matching.
+    Values are stored as JSON and passed through decode when read.
+    """
+
+    def __init__(self, path, namespace, fingerprint, decode=None, batch_size=1000):
+        self.path = path
+        self.namespace = namespace
+        self.fingerprint = fingerprint
+        self.decode = decode
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS parsed ("
+            "namespace TEXT, fingerprint TEXT, key TEXT, value TEXT, "
+            "PRIMARY KEY (namespace, fingerprint, key))"
+        )
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for key, or default if there is none
+        """
+        digest = line_hash(key)
+        if digest in self._pending:
+            value = self._pending[digest]
+        else:
+            row = self._connection.execute(
+                "SELECT value FROM parsed "
+                "WHERE namespace = ? AND fingerprint = ? AND key = ?",
+                (self.namespace, self.fingerprint, digest),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            value = json.loads(row[0])
+        self.hits += 1
+        return self.decode(value) if self.decode else value
+
+    def get_many(self, keys):
+        """
+        Returns a dict with the stored values of the keys that are in the cache
+        """
+        digests = {}
+        for key in keys:
+            digests.setdefault(line_hash(key), []).append(key)
+
+        stored = {
+            digest: self._pending[digest]
+            for digest in digests
+            if digest in self._pending
+        }
+        missing = [digest for digest in digests if digest not in stored]
+        # sqlite limits the number of parameters of a query
+        for start in range(0, len(missing), 500):
+            chunk = missing[start : start + 500]
+            rows = self._connection.execute(
+                "SELECT key, value FROM parsed "
+                "WHERE namespace = ? AND fingerprint = ? AND key IN ({})".format(
+                    ", ".join("?" * len(chunk))
+                ),
+                [self.namespace, self.fingerprint] + chunk,
+            )
+            for digest, value in rows:
+                stored[digest] = json.loads(value)
+
+        found = {}
+        for digest, value in stored.items():
+            if self.decode:
+                value = self.decode(value)
+            for key in digests[digest]:
+                found[key] = value
+        self.hits += len(stored)
+        self.misses += len(digests) - len(stored)
+        return found
+
+    def put(self, key, value):
+        """
+        Stores value for key. Writes are batched, call flush() to force them
+        """
+        self._pending[line_hash(key)] = json.loads(json.dumps(value))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def put_many(self, items):
+        """
+        Stores every (key, value) pair of items
+        """
+        for key, value in items:
+            self.put(key, value)
+
+    def reopen(self, batch_size=None):
+        """
+        Returns a new cache of the same file, namespace and fingerprint with its
+        own connection, i.e. for a worker process, which must not use a
+        connection opened before it was forked
+        """
+        return SQLiteParseCache(
+            self.path,
+            self.namespace,
+            self.fingerprint,
+            decode=self.decode,
+            batch_size=self.batch_size if batch_size is None else batch_size,
+        )
+
+    def take_pending(self):
+        """
+        Returns the entries that were not written yet and forgets them, so that
+        another process can write them with put_pending()
+        """
+        pending = self._pending
+        self._pending = {}
+        return pending
+
+    def put_pending(self, pending):
+        """
+        Stores the entries returned by take_pending() of another cache
+        """
+        self._pending.update(pending)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending entries to disk
+        """
+        if not self._pending:
+            return
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO parsed VALUES (?, ?, ?, ?)",
+            [
+                (self.namespace, self.fingerprint, digest, json.dumps(value))
+                for digest, value in self._pending.items()
+            ],
+        )
+        self._connection.commit()
+        self._pending.clear()
+
+    def prune(self):
+        """
+        Deletes the entries of this namespace made by other parser versions.
+        Returns the number of deleted entries
+        """
+        self.flush()
+        deleted = self._connection.execute(
+            "DELETE FROM parsed WHERE namespace = ? AND fingerprint != ?",
+            (self.namespace, self.fingerprint),
+        ).rowcount
+        self._connection.commit()
+        return deleted
+
+    def close(self):
+        """
+        Flushes the pending entries and closes the file
+        """
+        self.flush()
+        self._connection.close()
+
+    def stats(self):
+        """
+        Returns a dict with the hit and miss counts and the number of entries
+        stored for the current parser version
+        """
+        self.flush()
+        (size,) = self._connection.execute(
+            "SELECT COUNT(*) FROM parsed WHERE namespace = ? AND fingerprint = ?",
+            (self.namespace, self.fingerprint),
+        ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+def line_hash(line):
+    """
+    Returns the hex digest used as the persistent key of a line
+    """
+    return hashlib.sha1(line.encode("utf-8")).hexdigest()
+
+
+def fingerprint(*parts):
+    """
+    Returns a short hex digest of the JSON representation of parts
+    """
+    encoded = json.dumps(parts, sort_keys=True, default=repr).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def file_fingerprint(path):
+    """
+    Returns a short hex digest of the contents of a file, i.e. a trained model
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as model_file:
+        for block in iter(lambda: model_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+_MISSING = object()
@@ -0,0 +1,147 @@
+"""
+This module contains a column oriented accumulator for parsed ingredients. Rows
+are written into typed, growable column buffers and turned into a DataFrame (or
+an Arrow table) once at the end, instead of appending to a DataFrame per row.
+"""
+
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnarBuilder:
+    """
+    Accumulates parsed ingredients in title, amount, unit, ingredient and
+    descriptions columns. Titles and units repeat a lot, so they are dictionary
+    encoded, amounts are kept as doubles (NaN when missing).
+    """
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._capacity = max(capacity, 1)
+        self._titles = _DictionaryColumn(self._capacity)
+        self._amounts = array("d", bytes(8 * self._capacity))
+        self._units = _DictionaryColumn(self._capacity)
+        self._ingredients = [None] * self._capacity
+        self._descriptions = [None] * self._capacity
+
+    def __len__(self):
+        return self._size
+
+    def append(self, title, amount, unit, ingredient, descriptions=()):
+        """
+        Adds one parsed ingredient
+        """
+        if self._size == self._capacity:
+            self._grow()
+        row = self._size
+        self._titles.set(row, title)
+        self._amounts[row] = np.nan if amount is None else amount
+        self._units.set(row, unit)
+        self._ingredients[row] = ingredient
+        self._descriptions[row] = list(descriptions)
+        self._size += 1
+
+    def extend(self, ingredients):
+        """
+        Adds parsed ingredient dicts, as returned by util.parse_ingredient_list
+        """
+        for ingredient in ingredients:
+            self.append(
+                ingredient["title"],
+                ingredient["amount"],
+                ingredient["unit"],
+                ingredient["ingredient"],
+                ingredient["descriptions"],
+            )
+
+    def _grow(self):
+        extra = self._capacity
+        self._titles.grow(extra)
+        self._amounts.extend(array("d", bytes(8 * extra)))
+        self._units.grow(extra)
+        self._ingredients.extend([None] * extra)
+        self._descriptions.extend([None] * extra)
+        self._capacity += extra
+
+    def to_dataframe(self, categorical=True):
+        """
+        Returns the rows as a DataFrame. Title and unit are categorical columns,
+        unless categorical is False
+        """
+        size = self._size
+        frame = pd.DataFrame(
+            {
+                "title": self._titles.to_categorical(size),
+                "amount": np.frombuffer(self._amounts, np.float64, size).copy(),
+                "unit": self._units.to_categorical(size),
+                "ingredient": self._ingredients[:size],
+                "descriptions": self._descriptions[:size],
+            }
+        )
+        if not categorical:
+            frame["title"] = frame["title"].astype(object)
+            frame["unit"] = frame["unit"].astype(object)
+        return frame
+
+    def to_arrow(self):
+        """
+        Returns the rows as a pyarrow Table, title and unit are dictionary arrays
+        """
+        import pyarrow
+
+        size = self._size
+        return pyarrow.table(
+            {
+                "title": self._titles.to_arrow(size),
+                "amount": pyarrow.array(
+                    np.frombuffer(self._amounts, np.float64, size).copy(),
+                    from_pandas=True,
+                ),
+                "unit": self._units.to_arrow(size),
+                "ingredient": pyarrow.array(self._ingredients[:size], pyarrow.string()),
+                "descriptions": pyarrow.array(
+                    self._descriptions[:size], pyarrow.list_(pyarrow.string())
+                ),
+            }
+        )
+
+
+class _DictionaryColumn:
+    """
+    A column of repeated strings stored as integer codes into a list of distinct
+    values, with -1 for None and NaN
+    """
+
+    def __init__(self, capacity):
+        self.codes = array("i", bytes(4 * capacity))
+        self.values = []
+        self._value_codes = {}
+
+    def set(self, row, value):
+        # NaN is what read_json gives for a missing title, it is the only value
+        # that is not equal to itself
+        if value is None or value != value:
+            self.codes[row] = -1
+            return
+        code = self._value_codes.get(value)
+        if code is None:
+            code = self._value_codes[value] = len(self.values)
+            self.values.append(value)
+        self.codes[row] = code
+
+    def grow(self, extra):
+        self.codes.extend(array("i", bytes(4 * extra)))
+
+    def to_categorical(self, size):
+        codes = np.frombuffer(self.codes, np.int32, size).copy()
+        return pd.Categorical.from_codes(codes, self.values)
+
+    def to_arrow(self, size):
+        import pyarrow
+
+        codes = np.frombuffer(self.codes, np.int32, size).copy()
+        return pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(codes, mask=codes < 0), pyarrow.array(self.values)
+        )
@@ -0,0 +1,271 @@
+"""
+This module contains a pool of CRF taggers for tagging many ingredient sentences
+at once on several cores. Every worker process opens the trained pycrfsuite model
+once and tags whole batches of tokenized sentences.
+"""
+
+import os
+import time
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+import pycrfsuite
+
+import utils
+from cache import LRUCache, SQLiteParseCache, file_fingerprint, fingerprint
+from utils import getSentenceFeatures
+
+
+class TaggerPool:
+    """
+    Tags tokenized sentences with a trained pycrfsuite model. Sentences are sent
+    to the worker processes in batches; every tagged sentence comes back as a
+    (tags, confidences) tuple, where confidences are the marginal probabilities
+    of the chosen tags. Calls with at most one batch of sentences are tagged in
+    this process, so the pool is only started for large jobs. workers defaults
+    to the number of cores. With a cache (i.e. a cache.LRUCache), sentences
+    that were tagged before are not tagged again; cached results are tuples.
+    open_store() keeps the tagged sentences on disk across runs.
+    """
+
+    def __init__(
+        self, model_path="trained_pycrfsuite", workers=None, batch_size=256, cache=None
+    ):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.model_path = model_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.cache = cache
+        self._pool = None
+        self._tagger = None
+        self.sentences = 0
+        self.tokens = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.batch_seconds = 0.0
+        self.max_batch_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def tag(self, sentences):
+        """
+        Returns the (tags, confidences) of every sentence of a list of tokenized
+        sentences
+        """
+        return list(self.imap(sentences))
+
+    def imap(self, sentences):
+        """
+        Yields the (tags, confidences) of every tokenized sentence of an
+        iterable, in the same order. Only a few batches per worker are in
+        flight, so sentences can come from a generator.
+        """
+        if self.cache is None or not self.cache.enabled:
+            return self._tag_sentences(sentences)
+        return self._imap_cached(sentences)
+
+    def _imap_cached(self, sentences):
+        """
+        Looks the sentences up in the cache a window at a time and tags the
+        ones that are missing in batches
+        """
+        sentences = iter(sentences)
+        window_size = self.batch_size * max(self.workers, 1) * 4
+        while True:
+            window = list(islice(sentences, window_size))
+            if not window:
+                return
+            keys = [" ".join(sentence) for sentence in window]
+            tagged = {}
+            missing = {}
+            for key, sentence in zip(keys, window):
+                if key in tagged or key in missing:
+                    continue
+                value = self.cache.get(key)
+                if value is None:
+                    missing[key] = sentence
+                else:
+                    tagged[key] = value
+
+            store = self.cache.store
+            if missing and store is not None:
+                for key, value in store.get_many(missing).items():
+                    tagged[key] = value
+                    self.cache.put(key, value)
+                    del missing[key]
+
+            results = self._tag_sentences(list(missing.values()))
+            for key, (tags, confidences) in zip(missing, results):
+                tagged[key] = (tuple(tags), tuple(confidences))
+                self.cache.put(key, tagged[key])
+                if store is not None:
+                    store.put(key, tagged[key])
+            for key in keys:
+                yield tagged[key]
+
+    def _tag_sentences(self, sentences):
+        sentences = iter(sentences)
+        first = list(islice(sentences, self.batch_size))
+        second = list(islice(sentences, self.batch_size))
+
+        if self.workers <= 1 or not second:
+            if self._tagger is None:
+                self._tagger = _open_tagger(self.model_path)
+            batches = (
+                self._record(_tag_batch(self._tagger, batch))
+                for batch in _batches(first, second, sentences, self.batch_size)
+            )
+        else:
+            batches = self._imap_pool(_batches(first, second, sentences, self.batch_size))
+
+        # only the time spent waiting for the taggers is counted
+        while True:
+            started = time.perf_counter()
+            tagged = next(batches, None)
+            self.seconds += time.perf_counter() - started
+            if tagged is None:
+                return
+            yield from tagged
+
+    def _imap_pool(self, batches):
+        if self._pool is None:
+            self._pool = Pool(
+                self.workers, initializer=_init_worker, initargs=(self.model_path,)
+            )
+        max_pending = self.workers * 4
+        pending = deque()
+        while True:
+            batch = next(batches, None)
+            if batch:
+                pending.append(self._pool.apply_async(_tag_worker_batch, (batch,)))
+            if pending and (not batch or len(pending) >= max_pending):
+                yield self._record(pending.popleft().get())
+            elif not batch:
+                break
+
+    def _record(self, result):
+        tagged, tokens, seconds = result
+        self.sentences += len(tagged)
+        self.tokens += tokens
+        self.batches += 1
+        self.batch_seconds += seconds
+        self.max_batch_seconds = max(self.max_batch_seconds, seconds)
+        return tagged
+
+    def open_store(self, path):
+        """
+        Opens (or creates) an sqlite cache of tagged sentences at path and puts
+        it behind the cache, so sentences tagged in earlier runs are not tagged
+        again. Entries are stored under the "crf" namespace and a fingerprint of
+        the model and of the feature extraction code, entries of other models
+        are ignored. Close the returned store when done
+        """
+        if self.cache is None:
+            self.cache = LRUCache()
+        store = SQLiteParseCache(
+            path, "crf", tagger_fingerprint(self.model_path), decode=_decode_tagged
+        )
+        self.cache.store = store
+        return store
+
+    def close(self):
+        """
+        Stops the worker processes
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def stats(self):
+        """
+        Returns a dict with the number of tagged sentences, tokens and batches,
+        the throughput and the batch latencies in seconds, and the cache
+        statistics if there is a cache
+        """
+        stats = {
+            "sentences": self.sentences,
+            "tokens": self.tokens,
+            "batches": self.batches,
+            "seconds": self.seconds,
+            "sentences_per_second": self.sentences / self.seconds if self.seconds else 0.0,
+            "tokens_per_second": self.tokens / self.seconds if self.seconds else 0.0,
+            "mean_batch_seconds": self.batch_seconds / self.batches if self.batches else 0.0,
+            "max_batch_seconds": self.max_batch_seconds,
+        }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+def tagger_fingerprint(model_path):
+    """
+    Returns a fingerprint of a trained model and of the features it is given,
+    used to invalidate persistent caches of tagged sentences
+    """
+    return fingerprint(file_fingerprint(model_path), file_fingerprint(utils.__file__))
+
+
+def _decode_tagged(value):
+    tags, confidences = value
+    return tuple(tags), tuple(confidences)
+
+
+def _open_tagger(model_path):
+    tagger = pycrfsuite.Tagger()
+    tagger.open(model_path)
+    return tagger
+
+
+def _batches(first, second, sentences, batch_size):
+    """
+    Yields the batches of sentences, the first two are already read
+    """
+    if first:
+        yield first
+    if second:
+        yield second
+    while True:
+        batch = list(islice(sentences, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _tag_batch(tagger, batch):
+    """
+    Tags a batch of tokenized sentences. Returns the tagged sentences, the number
+    of tokens and the time it took
+    """
+    started = time.perf_counter()
+    tagged = []
+    tokens = 0
+    for sentence in batch:
+        features = [
+            [token] + token_features
+            for token, token_features in zip(sentence, getSentenceFeatures(sentence))
+        ]
+        tagger.set(features)
+        tags = tagger.tag()
+        confidences = [tagger.marginal(tag, i) for i, tag in enumerate(tags)]
+        tagged.append((tags, confidences))
+        tokens += len(sentence)
+    return tagged, tokens, time.perf_counter() - started
+
+
+def _init_worker(model_path):
+    global _tagger
+    _tagger = _open_tagger(model_path)
+
+
+def _tag_worker_batch(batch):
+    return _tag_batch(_tagger, batch)
+
+
+_tagger = None
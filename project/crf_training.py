@@ -0,0 +1,185 @@
+"""
+This module contains the tools used to retrain trained_pycrfsuite, starting with
+the generation of the CRF training corpus from labeled ingredient lines on
+several cores.
+
+Labeled data is kept in shard files with one token and its tag per line,
+separated by a tab, and a blank line after every ingredient:
+
+    1/2         B-QTY
+    teaspoon    B-UNIT
+    salt        B-NAME
+
+The features of every shard are extracted once into a cache directory, keyed by
+the contents of the shard and of the feature code, so retraining after a change
+to a few shards (or to nothing but the training parameters) only extracts what
+changed.
+"""
+
+import os
+import time
+
+import pycrfsuite
+
+import utils
+from batch import imap_ordered
+from cache import file_fingerprint
+from crf_tagger import TaggerPool
+from utils import export_line, getSentenceFeatures, joinLine
+
+
+def generate_training_corpus(lines, output, workers=None, chunksize=1024):
+    """
+    Writes the CRF-ready features of an iterable of "raw" ingredient lines to
+    output, a path or a file object (i.e. a pipe). Lines are sharded across
+    worker processes in chunks and written in their original order as soon as
+    they are done, so the output is the same as utils.export_data. workers
+    defaults to the number of cores. Returns the number of lines written.
+    """
+    if isinstance(output, str):
+        with open(output, "w", encoding="utf-8") as output_file:
+            return generate_training_corpus(lines, output_file, workers, chunksize)
+
+    blocks = imap_ordered(export_line, lines, workers=workers, chunksize=chunksize)
+    count = 0
+    for count, block in enumerate(blocks, 1):
+        if count > 1:
+            output.write("\n")
+        output.write(block)
+    return count
+
+
+def train_model(
+    shards,
+    model_path="trained_pycrfsuite",
+    cache_dir="crf_features",
+    algorithm="lbfgs",
+    max_iterations=100,
+    params=None,
+    test_shards=(),
+    workers=None,
+):
+    """
+    Trains a pycrfsuite model on labeled shard files and saves it to model_path.
+    algorithm is one of the pycrfsuite training algorithms ("lbfgs", "l2sgd",
+    "ap", "pa" or "arow"), params are extra parameters of that algorithm. The
+    new model tags the test shards (or the training shards if there are none).
+    Returns a report with the extraction and training times, the model size in
+    bytes, the tagging throughput and the token accuracy on the test shards.
+    """
+    shards = tuple(shards)
+    test_shards = tuple(test_shards)
+    started = time.perf_counter()
+    feature_files, extracted = extract_features(shards + test_shards, cache_dir, workers)
+    train_files = feature_files[: len(feature_files) - len(test_shards)]
+    test_files = feature_files[len(train_files) :] or train_files
+    extraction_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    trainer = pycrfsuite.Trainer(verbose=False)
+    trainer.select(algorithm)
+    trainer.set_params(dict(params or {}, max_iterations=max_iterations))
+    sentences = 0
+    for feature_file in train_files:
+        for features, tags in read_features(feature_file):
+            trainer.append(features, tags)
+            sentences += 1
+    trainer.train(model_path)
+    training_seconds = time.perf_counter() - started
+
+    test = [
+        ([columns[0] for columns in features], tags)
+        for feature_file in test_files
+        for features, tags in read_features(feature_file)
+    ]
+    with TaggerPool(model_path, workers=workers) as tagger_pool:
+        tagged = tagger_pool.tag(tokens for tokens, _ in test)
+        tagging = tagger_pool.stats()
+    correct = sum(
+        predicted == expected
+        for (predicted, _), (_, tags) in zip(tagged, test)
+        for predicted, expected in zip(predicted, tags)
+    )
+
+    return {
+        "shards": len(train_files),
+        "extracted_shards": extracted,
+        "sentences": sentences,
+        "extraction_seconds": extraction_seconds,
+        "training_seconds": training_seconds,
+        "model_bytes": os.path.getsize(model_path),
+        "tagging_sentences_per_second": tagging["sentences_per_second"],
+        "tagging_tokens_per_second": tagging["tokens_per_second"],
+        "accuracy": correct / tagging["tokens"] if tagging["tokens"] else 0.0,
+    }
+
+
+def extract_features(shards, cache_dir="crf_features", workers=None):
+    """
+    Makes sure the cache directory has the feature file of every shard and
+    returns the list of their paths and the number of shards that had to be
+    extracted. Shards are extracted in parallel.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    features_fingerprint = file_fingerprint(utils.__file__)
+    feature_files = [
+        os.path.join(
+            cache_dir,
+            "{}-{}.crf".format(file_fingerprint(shard), features_fingerprint),
+        )
+        for shard in shards
+    ]
+    missing = [
+        (shard, feature_file)
+        for shard, feature_file in zip(shards, feature_files)
+        if not os.path.exists(feature_file)
+    ]
+    if missing:
+        for _ in imap_ordered(_extract_shard, missing, workers=workers, chunksize=1):
+            pass
+    return feature_files, len(missing)
+
+
+def read_labeled(shard):
+    """
+    Yields the (tokens, tags) of every ingredient of a labeled shard file
+    """
+    with open(shard, encoding="utf-8") as shard_file:
+        for columns in _read_sentences(shard_file):
+            yield [column[0] for column in columns], [column[-1] for column in columns]
+
+
+def read_features(feature_file):
+    """
+    Yields the (features, tags) of every ingredient of a feature file, the
+    features of each token start with the token itself
+    """
+    with open(feature_file, encoding="utf-8") as features:
+        for columns in _read_sentences(features):
+            yield [column[:-1] for column in columns], [column[-1] for column in columns]
+
+
+def _read_sentences(lines):
+    sentence = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line:
+            sentence.append(line.split("\t"))
+        elif sentence:
+            yield sentence
+            sentence = []
+    if sentence:
+        yield sentence
+
+
+def _extract_shard(job):
+    shard, feature_file = job
+    # written next to the final file and renamed, so an interrupted extraction
+    # never leaves a partial feature file in the cache
+    partial_file = feature_file + ".partial"
+    with open(partial_file, "w", encoding="utf-8") as features:
+        for tokens, tags in read_labeled(shard):
+            for token, token_features, tag in zip(tokens, getSentenceFeatures(tokens), tags):
+                features.write(joinLine([token] + token_features + [tag]) + "\n")
+            features.write("\n")
+    os.replace(partial_file, feature_file)
@@ -0,0 +1,163 @@
+"""
+This module contains a bounded collector of parse errors. Instead of printing
+every failed ingredient, parsers add it to an ErrorSink, which counts errors by
+kind, keeps a random sample of examples of each kind and optionally writes the
+failed lines to a quarantine file, in batches.
+"""
+
+import json
+import logging
+import random
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorSink:
+    """
+    Counts parse errors by kind and keeps at most max_examples examples of each
+    kind, sampled uniformly from all errors of that kind. With a quarantine path,
+    every error is also appended to that file as a JSON line; lines are written
+    batch_size at a time.
+    """
+
+    def __init__(self, max_examples=10, quarantine=None, batch_size=1000, seed=None):
+        self.max_examples = max_examples
+        self.quarantine = quarantine
+        self.batch_size = batch_size
+        self.counts = Counter()
+        self.examples = {}
+        self._random = random.Random(seed)
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def add(self, kind, recipe_index, recipe_title, line):
+        """
+        Records an error of kind for the ingredient line of a recipe
+        """
+        self.counts[kind] += 1
+        example = {"kind": kind, "index": recipe_index, "title": recipe_title, "line": line}
+
+        # reservoir sampling, every error of a kind is kept with the same chance
+        examples = self.examples.setdefault(kind, [])
+        if len(examples) < self.max_examples:
+            examples.append(example)
+        else:
+            slot = self._random.randrange(self.counts[kind])
+            if slot < self.max_examples:
+                examples[slot] = example
+
+        if self.quarantine is not None:
+            self._pending.append(example)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def take(self):
+        """
+        Returns the counts, examples and pending quarantine errors and clears
+        them, without flushing, so that another process can merge() them
+        """
+        taken = {
+            "counts": dict(self.counts),
+            "examples": self.examples,
+            "pending": self._pending,
+        }
+        self.counts.clear()
+        self.examples = {}
+        self._pending = []
+        return taken
+
+    def merge(self, taken):
+        """
+        Adds the errors returned by take() of another sink. The examples of
+        every kind stay a uniform sample of all errors of that kind
+        """
+        for kind, count in taken["counts"].items():
+            mine = list(self.examples.get(kind, ()))
+            theirs = list(taken["examples"].get(kind, ()))
+            mine_left = self.counts[kind]
+            theirs_left = count
+            self.counts[kind] += count
+
+            # every draw takes a random example of one sink, chosen with the
+            # chance of its errors among those not drawn yet
+            examples = []
+            while len(examples) < self.max_examples and (mine or theirs):
+                if theirs and (
+                    not mine
+                    or self._random.randrange(mine_left + theirs_left) >= mine_left
+                ):
+                    examples.append(theirs.pop(self._random.randrange(len(theirs))))
+                    theirs_left -= 1
+                else:
+                    examples.append(mine.pop(self._random.randrange(len(mine))))
+                    mine_left -= 1
+            self.examples[kind] = examples
+
+        if self.quarantine is not None and taken["pending"]:
+            self._pending.extend(taken["pending"])
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Appends the pending errors to the quarantine file
+        """
+        if not self._pending:
+            return
+        with open(self.quarantine, "a", encoding="utf-8") as quarantine_file:
+            quarantine_file.writelines(
+                json.dumps(example, default=str) + "\n" for example in self._pending
+            )
+        self._pending.clear()
+
+    def close(self):
+        """
+        Flushes the pending errors
+        """
+        self.flush()
+
+    def clear(self):
+        """
+        Drops the counts and examples, pending errors are flushed first
+        """
+        self.flush()
+        self.counts.clear()
+        self.examples.clear()
+
+    def stats(self):
+        """
+        Returns a dict with the total number of errors, the count of every kind
+        and the sampled examples of every kind
+        """
+        return {
+            "errors": len(self),
+            "counts": dict(self.counts),
+            "examples": {kind: list(examples) for kind, examples in self.examples.items()},
+        }
+
+    def log_summary(self, log=logger):
+        """
+        Logs one line per kind of error with its count and an example
+        """
+        for kind, count in self.counts.most_common():
+            if not self.examples.get(kind):
+                log.warning("%d parse errors of kind %r", count, kind)
+                continue
+            example = self.examples[kind][0]
+            log.warning(
+                "%d parse errors of kind %r, i.e. recipe %s (%s): %r",
+                count,
+                kind,
+                example["index"],
+                example["title"],
+                example["line"],
+            )
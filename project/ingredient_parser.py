@@ -3,7 +3,7 @@ __author__ = 'sheraz/nibesh'
 import re
 from itertools import chain
 
-from utils import normalize, escape_re_string
+from utils_old import normalize, escape_re_string
 
 UNITS = {"cup": ["cups", "cup", "c.", "c"], "fluid_ounce": ["fl. oz.", "fl oz", "fluid ounce", "fluid ounces"],
          "gallon": ["gal", "gal.", "gallon", "gallons"], "ounce": ["oz", "oz.", "ounce", "ounces"],
@@ -24,13 +24,47 @@ NUMBERS = ['seventeen', 'eighteen', 'thirteen', 'nineteen', 'fourteen', 'sixteen
 
 prepositions = ["of"]
 
+
+def trie_regex(words):
+    """
+    Builds a regex matching any of the words from a character trie, so words
+    sharing a prefix share its states instead of being tried one by one. Like an
+    alternation sorted longest first, the longest word is preferred.
+
+    :param words: list of words, already escaped with escape_re_string
+    :return: regex string
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        # escaped characters ("\.") are kept together as one trie edge
+        for char in re.findall(r'\\.|.', word):
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return _trie_pattern(trie)
+
+
+def _trie_pattern(node):
+    branches = []
+    for char in sorted(node):
+        if char:
+            edge = re.escape(char) if len(char) == 1 else char
+            branches.append(edge + _trie_pattern(node[char]))
+    if not branches:
+        return ''
+    if len(branches) == 1 and '' not in node:
+        return branches[0]
+    # an optional group is greedy, so the longer words are tried first
+    return '(?:%s)%s' % ('|'.join(branches), '?' if '' in node else '')
+
+
 a = list(chain.from_iterable(UNITS.values()))
 a.sort(key=lambda x: len(x), reverse=True)
-a = map(escape_re_string, a)
+a = list(map(escape_re_string, a))
 
 PARSER_RE = re.compile(
-    r'(?P<quantity>(?:[\d\.,][\d\.,\s/]*)?\s*(?:(?:%s)\s*)*)?(\s*(?P<unit>%s)\s+)?(\s*(?:%s)\s+)?(\s*(?P<name>.+))?' % (
-        '|'.join(NUMBERS), '|'.join(a), '|'.join(prepositions)))
+    r'(?P<quantity>(?:[\d\.,][\d\.,\s/]*)?\s*(?:%s\s*)*)?(\s*(?P<unit>%s)\s+)?(\s*(?:%s)\s+)?(\s*(?P<name>.+))?' % (
+        trie_regex(NUMBERS), trie_regex(a), trie_regex(prepositions)))
 
 
 def parse(st):
@@ -39,7 +73,28 @@ def parse(st):
     :param st:
     :return:
     """
-    st = normalize(st)
+    return _parse_normalized(normalize(st))
+
+
+def parse_many(lines):
+    """
+    Parses a batch of ingredient lines. Every distinct line is normalized and
+    matched once, repeated lines share the result.
+
+    :param lines: iterable of ingredient lines
+    :return: list of parse results, in the order of lines
+    """
+    parsed = {}
+    results = []
+    for line in lines:
+        result = parsed.get(line)
+        if result is None:
+            result = parsed[line] = _parse_normalized(normalize(line))
+        results.append(dict(result))
+    return results
+
+
+def _parse_normalized(st):
     res = PARSER_RE.match(st)
 
     return {
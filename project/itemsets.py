@@ -0,0 +1,480 @@
+"""
+This module contains the frequent itemset miners used for the market-basket
+analysis of recipes. A basket is the set of ingredient names of a recipe, and an
+itemset is frequent when it is in more than floor(baskets * support) baskets,
+the threshold used by the Market-Basket Analysis notebook.
+"""
+
+import math
+import os
+import time
+import tracemalloc
+from multiprocessing import Pool
+
+
+def baskets_from_frame(frame, column="name"):
+    """
+    Returns the list of baskets of a frame of parsed ingredients indexed by
+    recipe (i.e. basket_parsed.pickle), one frozenset of names per recipe.
+    Missing names are skipped
+    """
+    return [
+        frozenset(name for name in basket[column] if isinstance(name, str))
+        for _, basket in frame.groupby(level=0)
+    ]
+
+
+def support_threshold(basket_count, support):
+    """
+    Returns the count an itemset must exceed to be frequent
+    """
+    return math.floor(basket_count * support)
+
+
+def eclat(baskets, support, max_size=None):
+    """
+    Returns a dict with the count of every frequent itemset (a frozenset) of
+    baskets, up to max_size items. Every frequent item gets a bitset of the
+    baskets it is in, stored in an int, and the count of an itemset is the
+    popcount of the AND of its items' bitsets. Itemsets are extended depth
+    first, so only the bitsets of one path are kept at a time
+    """
+    baskets = list(baskets)
+    threshold = support_threshold(len(baskets), support)
+
+    basket_ids = {}
+    for basket_id, basket in enumerate(baskets):
+        for item in basket:
+            basket_ids.setdefault(item, []).append(basket_id)
+
+    # least frequent items first keeps the intersections small
+    items = []
+    for item, ids in basket_ids.items():
+        if len(ids) > threshold:
+            items.append((item, bitset(ids, len(baskets)), len(ids)))
+    items.sort(key=lambda entry: (entry[2], entry[0]))
+
+    frequent = {}
+    _extend(frozenset(), items, threshold, max_size, frequent)
+    return frequent
+
+
+def _extend(prefix, items, threshold, max_size, frequent):
+    for position, (item, bits, count) in enumerate(items):
+        itemset = prefix | {item}
+        frequent[itemset] = count
+        if max_size is not None and len(itemset) >= max_size:
+            continue
+
+        extensions = []
+        for other, other_bits, _ in items[position + 1 :]:
+            both = bits & other_bits
+            both_count = popcount(both)
+            if both_count > threshold:
+                extensions.append((other, both, both_count))
+        if extensions:
+            _extend(itemset, extensions, threshold, max_size, frequent)
+
+
+def bitset(ids, size):
+    """
+    Returns an int with the bits of ids set, out of size bits
+    """
+    packed = bytearray((size + 7) // 8)
+    for index in ids:
+        packed[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(packed, "little")
+
+
+def popcount(bits):
+    """
+    Returns the number of bits set in an int
+    """
+    return bits.bit_count()
+
+
+if not hasattr(int, "bit_count"):
+
+    def popcount(bits):
+        return bin(bits).count("1")
+
+
+def fp_growth(baskets, support, max_size=None):
+    """
+    Returns a dict with the count of every frequent itemset of baskets, up to
+    max_size items. The baskets are read twice, to count the items and to
+    insert their frequent items, most frequent first, into a prefix tree (the
+    FP-tree). Itemsets are then grown from the tree of the baskets that contain
+    each item, without generating candidates, which stays fast at low support
+    """
+    baskets = list(baskets)
+    threshold = support_threshold(len(baskets), support)
+    header, counts = _build_tree(((basket, 1) for basket in baskets), threshold)
+
+    frequent = {}
+    _grow(header, counts, frozenset(), threshold, max_size, frequent)
+    return frequent
+
+
+class _Node:
+    """
+    A node of an FP-tree, the path from the root is a prefix of some baskets and
+    count is the number of those baskets
+    """
+
+    __slots__ = ("item", "count", "parent", "children")
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+def _build_tree(transactions, threshold, ordered=False):
+    """
+    Builds the FP-tree of (items, count) transactions. Returns the header table,
+    which maps every frequent item to its nodes, and the counts of the items.
+    Items are inserted most frequent first, unless the transactions are already
+    ordered (the paths of a tree keep the order of that tree)
+    """
+    transactions = list(transactions)
+    counts = {}
+    for items, count in transactions:
+        for item in items:
+            counts[item] = counts.get(item, 0) + count
+    counts = {item: count for item, count in counts.items() if count > threshold}
+    if not ordered:
+        rank = {
+            item: position
+            for position, item in enumerate(
+                sorted(counts, key=lambda item: (-counts[item], item))
+            )
+        }
+
+    root = _Node(None, None)
+    header = {}
+    for items, count in transactions:
+        node = root
+        if ordered:
+            items = [item for item in items if item in counts]
+        else:
+            items = sorted((item for item in items if item in rank), key=rank.get)
+        for item in items:
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = _Node(item, node)
+                header.setdefault(item, []).append(child)
+            child.count += count
+            node = child
+    return header, counts
+
+
+def _grow(header, counts, suffix, threshold, max_size, frequent):
+    for item in sorted(header, key=lambda item: (counts[item], item)):
+        itemset = suffix | {item}
+        frequent[itemset] = counts[item]
+        if max_size is not None and len(itemset) >= max_size:
+            continue
+
+        # the paths above the item's nodes are the baskets that contain it
+        paths = []
+        for node in header[item]:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            if path:
+                path.reverse()
+                paths.append((path, node.count))
+        if paths:
+            conditional_header, conditional_counts = _build_tree(
+                paths, threshold, ordered=True
+            )
+            _grow(
+                conditional_header,
+                conditional_counts,
+                itemset,
+                threshold,
+                max_size,
+                frequent,
+            )
+
+
+def apriori_trie(baskets, support, max_size=None):
+    """
+    Returns a dict with the count of every frequent itemset of baskets, up to
+    max_size items, found level by level. Items are numbered in sorted order and
+    itemsets are sorted tuples of those numbers, so candidates come from joining
+    itemsets with the same prefix (see generate_candidates) and are counted
+    with a trie walk over every basket instead of a subset test per candidate
+    """
+    baskets = list(baskets)
+    threshold = support_threshold(len(baskets), support)
+
+    counts = {}
+    for basket in baskets:
+        for item in basket:
+            counts[item] = counts.get(item, 0) + 1
+    items = sorted(item for item, count in counts.items() if count > threshold)
+    item_ids = {item: item_id for item_id, item in enumerate(items)}
+
+    level = {(item_ids[item],): counts[item] for item in items}
+    frequent = dict(level)
+    transactions = [
+        tuple(sorted(item_ids[item] for item in basket if item in item_ids))
+        for basket in baskets
+    ]
+    size = 1
+    while level and (max_size is None or size < max_size):
+        size += 1
+        candidates = generate_candidates(sorted(level), size)
+        if not candidates:
+            break
+
+        # items that are in no candidate cannot be part of a frequent itemset
+        live = set().union(*candidates)
+        transactions = [
+            transaction
+            for transaction in (
+                tuple(item for item in transaction if item in live)
+                for transaction in transactions
+            )
+            if len(transaction) >= size
+        ]
+        level = {
+            candidate: count
+            for candidate, count in count_candidates(candidates, transactions).items()
+            if count > threshold
+        }
+        frequent.update(level)
+
+    return {
+        frozenset(items[item_id] for item_id in itemset): count
+        for itemset, count in frequent.items()
+    }
+
+
+def generate_candidates(level, size):
+    """
+    Returns the candidate itemsets of size items from the sorted list of the
+    frequent itemsets of size - 1 items, each a sorted tuple. Two itemsets are
+    joined only if they share all but their last item, and a candidate is kept
+    only if all its subsets of size - 1 items are frequent
+    """
+    frequent = set(level)
+    candidates = []
+    start = 0
+    while start < len(level):
+        # itemsets with the same prefix are next to each other in sorted order
+        prefix = level[start][:-1]
+        end = start + 1
+        while end < len(level) and level[end][:-1] == prefix:
+            end += 1
+        for first in range(start, end):
+            for second in range(first + 1, end):
+                candidate = level[first] + level[second][-1:]
+                # the two subsets without one of the last items are the joined
+                # itemsets, the others have to be looked up
+                if all(
+                    candidate[:index] + candidate[index + 1 :] in frequent
+                    for index in range(size - 2)
+                ):
+                    candidates.append(candidate)
+        start = end
+    return candidates
+
+
+def count_candidates(candidates, transactions):
+    """
+    Returns the number of transactions (sorted tuples) that contain each
+    candidate (a sorted tuple of the same size). The candidates are put in a
+    trie and every transaction walks the branches of its own items only
+    """
+    size = len(candidates[0])
+    trie = {}
+    for candidate in candidates:
+        node = trie
+        for item in candidate[:-1]:
+            node = node.setdefault(item, {})
+        node[candidate[-1]] = 0
+
+    for transaction in transactions:
+        _count_walk(trie, transaction, 0, size)
+
+    counts = {}
+    for candidate in candidates:
+        node = trie
+        for item in candidate[:-1]:
+            node = node[item]
+        counts[candidate] = node[candidate[-1]]
+    return counts
+
+
+def _count_walk(node, transaction, start, remaining):
+    if remaining == 1:
+        for item in transaction[start:]:
+            if item in node:
+                node[item] += 1
+        return
+    # leave enough items after this one to complete the itemset
+    for position in range(start, len(transaction) - remaining + 1):
+        child = node.get(transaction[position])
+        if child is not None:
+            _count_walk(child, transaction, position + 1, remaining - 1)
+
+
+def son(baskets, support, max_size=None, workers=None, partitions=None, miner=eclat):
+    """
+    Returns a dict with the count of every frequent itemset of baskets, up to
+    max_size items, mined in parallel with the SON algorithm. The baskets are
+    split into partitions and each one is mined on its own with miner, at the
+    same support. An itemset that is frequent overall is frequent in at least
+    one partition, so the union of the local results holds every frequent
+    itemset; one more pass counts those candidates over all the baskets, which
+    makes the counts exact. workers defaults to the number of cores and
+    partitions to the number of workers; with 1 worker no pool is started.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if partitions is None:
+        partitions = workers
+    baskets = list(baskets)
+    threshold = support_threshold(len(baskets), support)
+    size = -(-len(baskets) // max(partitions, 1)) or 1
+    chunks = [baskets[start : start + size] for start in range(0, len(baskets), size)]
+
+    if workers <= 1:
+        local = [_mine_partition(miner, chunk, support, max_size) for chunk in chunks]
+        candidates = sorted(set().union(*local), key=len)
+        partial = [_count_partition(candidates, chunk) for chunk in chunks]
+    else:
+        with Pool(workers) as pool:
+            local = pool.starmap(
+                _mine_partition, [(miner, chunk, support, max_size) for chunk in chunks]
+            )
+            candidates = sorted(set().union(*local), key=len)
+            partial = pool.starmap(
+                _count_partition, [(candidates, chunk) for chunk in chunks]
+            )
+
+    counts = dict.fromkeys(candidates, 0)
+    for chunk_counts in partial:
+        for itemset, count in chunk_counts.items():
+            counts[itemset] += count
+    return {itemset: count for itemset, count in counts.items() if count > threshold}
+
+
+def _mine_partition(miner, baskets, support, max_size):
+    return set(miner(baskets, support, max_size))
+
+
+def _count_partition(candidates, baskets):
+    """
+    Returns the number of baskets that contain each candidate itemset, counted
+    with a trie per itemset size
+    """
+    items = sorted(set().union(*candidates))
+    item_ids = {item: item_id for item_id, item in enumerate(items)}
+    transactions = [
+        tuple(sorted(item_ids[item] for item in basket if item in item_ids))
+        for basket in baskets
+    ]
+
+    by_size = {}
+    for candidate in candidates:
+        by_size.setdefault(len(candidate), []).append(
+            tuple(sorted(item_ids[item] for item in candidate))
+        )
+    counts = {}
+    for size, sized in by_size.items():
+        sized_counts = count_candidates(
+            sized, [transaction for transaction in transactions if len(transaction) >= size]
+        )
+        for itemset, count in sized_counts.items():
+            counts[frozenset(items[item_id] for item_id in itemset)] = count
+    return counts
+
+
+def mine_with_report(miner, baskets, support, max_size=None):
+    """
+    Runs a miner (i.e. fp_growth) and returns the frequent itemsets and a dict
+    with the run time in seconds and the peak memory allocated in bytes. Memory
+    is traced, so the run is slower than without the report
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        frequent = miner(baskets, support, max_size)
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return frequent, {"itemsets": len(frequent), "seconds": seconds, "peak_bytes": peak}
+
+
+def cross_check(
+    baskets, support, max_size=None, miners=(eclat, fp_growth, apriori_trie)
+):
+    """
+    Checks that every miner finds the same itemsets with the same counts as
+    apriori, which is slow, so use small inputs. Returns the apriori result or
+    raises ValueError naming the first miner that differs
+    """
+    baskets = list(baskets)
+    expected = apriori(baskets, support, max_size)
+    for miner in miners:
+        found = miner(baskets, support, max_size)
+        if found != expected:
+            raise ValueError(
+                "{} differs from apriori on {} itemsets".format(
+                    miner.__name__, len(set(found.items()) ^ set(expected.items()))
+                )
+            )
+    return expected
+
+
+def apriori(baskets, support, max_size=None):
+    """
+    Returns a dict with the count of every frequent itemset of baskets, up to
+    max_size items, found level by level like the notebook's apriori. This is
+    the reference the faster miners are checked against
+    """
+    baskets = list(baskets)
+    threshold = support_threshold(len(baskets), support)
+
+    counts = {}
+    for basket in baskets:
+        for item in basket:
+            itemset = frozenset([item])
+            counts[itemset] = counts.get(itemset, 0) + 1
+    level = {itemset: count for itemset, count in counts.items() if count > threshold}
+
+    frequent = dict(level)
+    size = 1
+    while level and (max_size is None or size < max_size):
+        size += 1
+        candidates = generate_candidate_set(size, list(level))
+        counts = dict.fromkeys(candidates, 0)
+        for basket in baskets:
+            for candidate in candidates:
+                if candidate <= basket:
+                    counts[candidate] += 1
+        level = {itemset: count for itemset, count in counts.items() if count > threshold}
+        frequent.update(level)
+    return frequent
+
+
+def generate_candidate_set(size, L):
+    """
+    Returns the itemsets of size items that are the union of two itemsets of L
+    which differ by one item
+    """
+    candidate_set = set()
+    for i in range(len(L)):
+        for j in range(i + 1, len(L)):
+            union = L[i] | L[j]
+            if len(union) == size:
+                candidate_set.add(frozenset(union))
+    return candidate_set
@@ -1,9 +1,10 @@
 from collections import Counter
-import pandas as pd
-import numpy as np
+from itertools import islice
 import re
 import string
 
+from recipe_reader import iter_recipes
+
 UNITS = {"cup": ["cups", "cup", "c.", "c"], "fluid_ounce": ["fl. oz.", "fl oz", "fluid ounce", "fluid ounces"],
          "gallon": ["gal", "gal.", "gallon", "gallons"], "ounce": ["oz", "oz.", "ounce", "ounces"],
          "pint": ["pt", "pt.", "pint", "pints"], "pound": ["lb", "lb.", "pound", "pounds"],
@@ -19,17 +20,16 @@ UNITS = {"cup": ["cups", "cup", "c.", "c"], "fluid_ounce": ["fl. oz.", "fl oz",
 units = [item for sublist in UNITS.values() for item in sublist]
 
 counts = []
-df = pd.read_json("recipes_raw_nosource_ar.json")
-
-
-df = df.transpose()
-print(df.head())
+# recipes are streamed as (recipe_id, title, ingredients) tuples
+recipes = iter_recipes("recipes_raw_nosource_ar.json")
+for recipe in islice(recipes, 5):
+    print(recipe)
 """
 cnt = 0
-for index, row in df.iterrows():
-    #print(row["ingredients"])
-    if isinstance(row["ingredients"], list):
-        for i in row["ingredients"]:
+for index, title, ingredients in recipes:
+    #print(ingredients)
+    if isinstance(ingredients, list):
+        for i in ingredients:
             words = i.lower()
             words = words.replace("\u00ae", "")
             groups = re.search(r"([0-9]+)\s\(([0-9a-zA-Z\s]+)\)", words)
@@ -0,0 +1,117 @@
+"""
+This module contains a streaming reader for the recipes_raw_*.json datasets, which
+are one large JSON object mapping recipe ids to recipes. Records are decoded one
+at a time, so memory use does not grow with the size of the file.
+"""
+
+import json
+import re
+
+WHITESPACE_REGEX = re.compile(r"\s*")
+
+
+def iter_recipes(path, block_size=1 << 16):
+    """
+    Yields a (recipe_id, title, ingredients) tuple for every recipe in a
+    recipes_raw_*.json file, in file order. Missing fields are None
+    """
+    with open(path, encoding="utf-8") as recipe_file:
+        for recipe_id, recipe in iter_json_object(recipe_file, block_size):
+            if not isinstance(recipe, dict):
+                recipe = {}
+            yield recipe_id, recipe.get("title"), recipe.get("ingredients")
+
+
+def iter_json_object(json_file, block_size=1 << 16):
+    """
+    Yields the (key, value) pairs of the top level JSON object in a file, reading
+    it block by block. Only the value being decoded is kept in memory
+    """
+    decoder = json.JSONDecoder()
+    reader = _BlockReader(json_file, block_size)
+
+    reader.skip_whitespace()
+    if reader.next_character() != "{":
+        raise ValueError("Expected a JSON object at the top level")
+
+    reader.skip_whitespace()
+    if reader.peek() == "}":
+        return
+
+    while True:
+        key = reader.decode(decoder)
+        reader.skip_whitespace()
+        if reader.next_character() != ":":
+            raise ValueError("Expected ':' after key {!r}".format(key))
+        reader.skip_whitespace()
+        yield key, reader.decode(decoder)
+
+        reader.skip_whitespace()
+        separator = reader.next_character()
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError("Expected ',' or '}' after the value of {!r}".format(key))
+        reader.skip_whitespace()
+
+
+class _BlockReader:
+    """
+    A window over a text file that is extended block by block as values are
+    decoded and trimmed once they are consumed
+    """
+
+    def __init__(self, text_file, block_size):
+        self.text_file = text_file
+        self.block_size = block_size
+        self.buffer = ""
+        self.position = 0
+        self.at_end = False
+
+    def fill(self):
+        """
+        Reads the next block, returns False at the end of the file
+        """
+        if self.at_end:
+            return False
+        block = self.text_file.read(self.block_size)
+        if not block:
+            self.at_end = True
+            return False
+        self.buffer = self.buffer[self.position :] + block
+        self.position = 0
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            self.position = WHITESPACE_REGEX.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or not self.fill():
+                return
+
+    def peek(self):
+        if self.position >= len(self.buffer) and not self.fill():
+            raise ValueError("Unexpected end of JSON file")
+        return self.buffer[self.position]
+
+    def next_character(self):
+        character = self.peek()
+        self.position += 1
+        return character
+
+    def decode(self, decoder):
+        """
+        Decodes the JSON value at the current position, reading more blocks until
+        the value is complete
+        """
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # a number at the end of the buffer might continue in the next block
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.position = end
+            return value
@@ -0,0 +1,74 @@
+"""
+This module contains the counters used to see where parsing time goes. Stages
+are named by their path in the call tree, i.e. "parse_ingredient;parse;unit",
+and every stage keeps its call count, cumulative time and number of tokens.
+"""
+
+import time
+
+
+class StageStats:
+    """
+    Per-stage call counts, cumulative seconds and token counts. Parsers call
+    lap() at the end of each stage with the time the stage started.
+    """
+
+    def __init__(self):
+        self.clock = time.perf_counter
+        self.calls = {}
+        self.seconds = {}
+        self.tokens = {}
+
+    def lap(self, stage, started, tokens=0):
+        """
+        Records a call of stage that started at started (a clock() value) and
+        went through tokens tokens. Returns the current clock() value, which is
+        when the next stage starts
+        """
+        now = self.clock()
+        if stage in self.calls:
+            self.calls[stage] += 1
+            self.seconds[stage] += now - started
+            self.tokens[stage] += tokens
+        else:
+            self.calls[stage] = 1
+            self.seconds[stage] = now - started
+            self.tokens[stage] = tokens
+        return now
+
+    def clear(self):
+        self.calls.clear()
+        self.seconds.clear()
+        self.tokens.clear()
+
+    def stats(self):
+        """
+        Returns a dict with the calls, seconds and tokens of every stage
+        """
+        return {
+            stage: {
+                "calls": self.calls[stage],
+                "seconds": self.seconds[stage],
+                "tokens": self.tokens[stage],
+            }
+            for stage in self.calls
+        }
+
+    def self_seconds(self):
+        """
+        Returns the time spent in every stage but not in the stages below it
+        """
+        own = dict(self.seconds)
+        for stage, seconds in self.seconds.items():
+            parent = stage.rpartition(";")[0]
+            if parent in own:
+                own[parent] -= seconds
+        return {stage: max(seconds, 0.0) for stage, seconds in own.items()}
+
+    def write_collapsed(self, output):
+        """
+        Writes the stages in the collapsed stack format of flame graph tools
+        (one "stage;substage microseconds" line per stage) to a file object
+        """
+        for stage, seconds in sorted(self.self_seconds().items()):
+            output.write("{} {}\n".format(stage, round(seconds * 1e6)))
@@ -0,0 +1,120 @@
+"""
+This module contains the unit registry used to convert ingredient amounts to
+metric. Every unit spelling maps to its dimension and the factor to the base unit
+of that dimension (grams for mass, milliliters for volume).
+"""
+
+# base unit of each dimension
+BASE_UNITS = {"mass": "grams", "volume": "milliliters"}
+
+# canonical unit -> (dimension, factor to the base unit, other spellings)
+UNITS = {
+    "pound": ("mass", 453.592, ["pounds", "lb", "lb.", "lbs", "lbs."]),
+    "ounce": ("mass", 28.3495, ["ounces", "oz", "oz."]),
+    "gram": ("mass", 1.0, ["grams", "g", "g.", "gr", "gr."]),
+    "kilogram": ("mass", 1000.0, ["kilograms", "kg", "kg."]),
+    "milligram": ("mass", 0.001, ["milligrams", "mg", "mg."]),
+    "teaspoon": ("volume", 4.92892, ["teaspoons", "tsp", "tsp.", "t", "t."]),
+    "dessertspoon": ("volume", 9.85784, ["dessertspoons"]),
+    "tablespoon": (
+        "volume",
+        14.7868,
+        ["tablespoons", "tbsp", "tbsp.", "tbs", "tbs.", "T", "T."],
+    ),
+    "cup": ("volume", 236.588, ["cups", "c", "c."]),
+    "pinch": ("volume", 4.92892 / 16, ["pinches"]),
+    "dash": ("volume", 4.92892 / 8, ["dashes"]),
+    "fluid ounce": (
+        "volume",
+        29.5735,
+        ["fluid ounces", "fluid_ounce", "fluid_ounces", "fl oz", "fl. oz."],
+    ),
+    "pint": ("volume", 473.176, ["pints", "pt", "pt."]),
+    "quart": ("volume", 946.353, ["quarts", "qt", "qt.", "qts", "qts."]),
+    "gallon": ("volume", 3785.41, ["gallons", "gal", "gal."]),
+    "liter": ("volume", 1000.0, ["liters", "l", "l."]),
+    "milliliter": ("volume", 1.0, ["milliliters", "ml", "ml."]),
+    "drop": ("volume", 0.05, ["drops"]),
+    "jigger": ("volume", 44.3603, ["jiggers"]),
+}
+
+# volume units with an exact size in US cups, as (numerator, denominator)
+CUP_RATIOS = {
+    "teaspoon": (1, 48),
+    "dessertspoon": (1, 24),
+    "tablespoon": (1, 16),
+    "cup": (1, 1),
+    "pinch": (1, 768),
+    "dash": (1, 384),
+    "fluid ounce": (1, 8),
+    "pint": (2, 1),
+    "quart": (4, 1),
+    "gallon": (16, 1),
+    "jigger": (3, 16),
+}
+
+# every spelling -> (dimension, factor to the base unit)
+UNIT_REGISTRY = {}
+# every spelling of a volume unit -> (numerator, denominator) of its size in cups
+CUP_REGISTRY = {}
+for _unit, (_dimension, _factor, _spellings) in UNITS.items():
+    for _spelling in [_unit] + _spellings:
+        UNIT_REGISTRY[_spelling] = (_dimension, _factor)
+        if _dimension == "volume":
+            CUP_REGISTRY[_spelling] = CUP_RATIOS.get(_unit, (_factor, UNITS["cup"][1]))
+
+
+def convert(amount, unit):
+    """
+    Converts an amount to the base unit of its dimension. Returns the new
+    (amount, unit), or the arguments unchanged if the unit is not known
+    """
+    try:
+        dimension, factor = UNIT_REGISTRY[unit]
+    except (KeyError, TypeError):
+        return amount, unit
+    return amount * factor, BASE_UNITS[dimension]
+
+
+def to_cups(amount, unit):
+    """
+    Converts an amount of a volume unit to cups, other amounts are unchanged.
+    US units use their exact ratio to the cup, metric ones their milliliters
+    """
+    try:
+        numerator, denominator = CUP_REGISTRY[unit]
+    except (KeyError, TypeError):
+        return amount
+    return amount * numerator / denominator
+
+
+def normalize_units(
+    frame, amount_column="amount", unit_column="unit", base_units=BASE_UNITS
+):
+    """
+    Returns a copy of frame with every amount converted to the base unit of its
+    dimension, labelled from base_units. The unit column is looked up once per distinct unit through its
+    categorical codes, so the frame is only scanned once. Amounts that are not
+    numbers become NaN
+    """
+    # imported here so the scalar conversions work without pandas
+    import numpy as np
+    import pandas as pd
+
+    units = pd.Categorical(frame[unit_column])
+    codes = units.codes
+    factors = np.ones(len(units.categories) + 1)
+    targets = np.empty(len(units.categories) + 1, dtype=object)
+    targets[-1] = np.nan
+    for code, unit in enumerate(units.categories):
+        targets[code] = unit
+        if unit in UNIT_REGISTRY:
+            dimension, factors[code] = UNIT_REGISTRY[unit]
+            targets[code] = base_units[dimension]
+
+    # code -1 (a missing unit) picks the last entry, which leaves it unchanged
+    converted = frame.copy()
+    amounts = pd.to_numeric(frame[amount_column], errors="coerce").to_numpy(float)
+    converted[amount_column] = amounts * factors[codes]
+    converted[unit_column] = pd.Categorical(targets[codes])
+    return converted
@@ -4,7 +4,14 @@ tables. Some code adapted from https://github.com/kbrohkahn/recipe-parser.
 """
 
 import re
+from contextlib import contextmanager
 from fractions import Fraction
+from functools import lru_cache
+
+from cache import LRUCache, SQLiteParseCache, fingerprint
+from error_sink import ErrorSink
+from stage_stats import StageStats
+from units import CUP_RATIOS, UNITS, to_cups
 
 
 def equal_checking_plurals(string, plural_string):
@@ -39,6 +46,9 @@ def in_checking_plurals(string, plural_list):
     """
     Checks whether the first argument matches a string in a list of plurals, checking plurals
     """
+    if isinstance(plural_list, Lexicon):
+        return plural_list.match(string)
+
     for plural_string in plural_list:
         if equal_checking_plurals(string, plural_string):
             return plural_string
@@ -46,6 +56,98 @@ def in_checking_plurals(string, plural_list):
     return None
 
 
+class Lexicon:
+    """
+    Precompiled lookup table over a list of (plural) words. Membership tests are
+    exact, while match() finds the entry a word is a singular or plural form of,
+    with the same result as in_checking_plurals on the original list.
+    """
+
+    def __init__(self, entries):
+        self.entries = tuple(entries)
+        self._members = frozenset(self.entries)
+        self._rank = {}
+        self._forms = {}
+        self._stems = {}
+        for rank, entry in enumerate(self.entries):
+            if entry in self._rank:
+                continue
+            self._rank[entry] = rank
+
+            # every word w for which entry is one of w, w+"s", w+"es"
+            forms = {entry}
+            if entry.endswith("s"):
+                forms.add(entry[:-1])
+            if entry.endswith("es"):
+                forms.add(entry[:-2])
+            for form in forms:
+                self._forms.setdefault(form, []).append(entry)
+
+            # w[:-1] + "ies" and w[:-1] + "ves" only depend on the stem of w
+            if entry.endswith(("ies", "ves")):
+                self._stems.setdefault(entry[:-3], []).append(entry)
+
+    def __contains__(self, word):
+        return word in self._members
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, word):
+        """
+        Returns the first entry that word is a singular or plural form of, or None
+        """
+        candidates = self._forms.get(word, []) + self._stems.get(word[:-1], [])
+        for entry in sorted(candidates, key=self._rank.__getitem__):
+            if equal_checking_plurals(word, entry):
+                return entry
+
+        return None
+
+
+class Rewriter:
+    """
+    Applies an ordered table of (old, new) string replacements, with the same
+    result as calling str.replace for every rule in order. Rules whose text is
+    not in the string are skipped with an "in" test, which is cheaper than a
+    regex scan of the string. Set VERIFY_REWRITES to check the result against
+    the plain str.replace chain.
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+
+    def apply(self, string):
+        """
+        Applies every rule to string
+        """
+        result = string
+        for old, new in self.rules:
+            if old in result:
+                result = result.replace(old, new)
+
+        if VERIFY_REWRITES:
+            expected = self.apply_sequentially(string)
+            if result != expected:
+                raise AssertionError(
+                    "Rewrite of {!r} gave {!r}, expected {!r}".format(
+                        string, result, expected
+                    )
+                )
+        return result
+
+    def apply_sequentially(self, string):
+        """
+        Applies every rule to string with one str.replace per rule
+        """
+        for old, new in self.rules:
+            string = string.replace(old, new)
+        return string
+
+
 def is_number(string):
     """
     Checks if argument is a number or not, because python's builtin
@@ -58,24 +160,45 @@ def is_number(string):
         return False
 
 
+def parse_quantity(string, exact=False):
+    """
+    Parses a quantity such as "2", "1.5", "1/2", "1 1/2", "½" or "1½". Returns None
+    if the string is not a quantity. Integers are returned as int and everything
+    else as float, like eval would, or as a Fraction if exact is True.
+    """
+    if not string or string[0] not in QUANTITY_START_CHARACTERS:
+        return None
+    return _parse_quantity(string, exact)
+
+
+@lru_cache(maxsize=4096)
+def _parse_quantity(string, exact):
+    match = QUANTITY_REGEX.fullmatch(string)
+    if not match:
+        return None
+
+    decimal = match.group("decimal")
+    integer = match.group("integer")
+    if decimal is not None:
+        quantity = Fraction(decimal)
+    elif integer is not None:
+        return Fraction(int(integer)) if exact else int(integer)
+    elif match.group("vulgar") is not None:
+        whole = match.group("whole_vulgar") or 0
+        quantity = int(whole) + VULGAR_FRACTIONS[match.group("vulgar")]
+    else:
+        whole = match.group("whole") or 0
+        denominator = int(match.group("denominator"))
+        if denominator == 0:
+            return None
+        quantity = int(whole) + Fraction(int(match.group("numerator")), denominator)
+
+    return quantity if exact else float(quantity)
+
+
 # transform amount to cups based on amount and original unit
 def transformToCups(amount, unit):
-    if unit == "cups":
-        return amount
-    elif unit == "quarts":
-        return amount / 16
-    elif unit == "quarts":
-        return amount / 4
-    elif unit == "pints":
-        return amount / 2
-    elif unit == "ounces":
-        return amount * 8
-    elif unit == "tablespoons":
-        return amount * 16
-    elif unit == "teaspoons":
-        return amount * 48
-    else:
-        return amount
+    return to_cups(amount, unit)
 
 
 def is_seperator(ingredient_string):
@@ -86,184 +209,264 @@ def is_seperator(ingredient_string):
     )
 
 
-def get_ingredient_amount(parsed_ingredient, ingredient):
-    ingredient["amount"] = 0
-    while parsed_ingredient:
-        # get first word
-
-        # if first word is digit or fraction, eval
-        # "x" not multiplier, "%" used as modulo
-        try:
-            ingredient["amount"] += eval(parsed_ingredient[0])
-            del parsed_ingredient[0]
-        except (SyntaxError, NameError, TypeError):
+# roles a token can be tagged with by the parsing stages
+AMOUNT = "amount"
+UNIT = "unit"
+DESCRIPTION = "description"
+NAME = "name"
+DROP = "drop"
+
+# kinds of parse errors, a stage that fails adds its kind to ERROR_SINK
+UNIT_ERROR = "unit"
+NAME_ERROR = "ingredient"
+
+
+def split_ingredient_words(ingredient_string):
+    """
+    Splits an ingredient string into a tuple of words, ignoring extra spaces
+    """
+    return tuple(word for word in ingredient_string.split(" ") if word)
+
+
+def words_with_role(tokens, roles, role=NAME):
+    """
+    Returns the list of tokens tagged with role, in order
+    """
+    return [token for token, token_role in zip(tokens, roles) if token_role == role]
+
+
+def tag_prepositions(tokens, roles):
+    """
+    Tags the first prepositional phrase as a description. Returns the new roles
+    and the phrase, or None if there is none
+    """
+    for index, word in enumerate(tokens):
+        if roles[index] != NAME or word not in PREPOSITION_LEXICON:
+            continue
+        if (index + 1 < len(tokens) and tokens[index + 1] == "use") or (
+            index > 0 and tokens[index - 1] == "bone" and word == "in"
+        ):
+            continue
+
+        roles = roles[:index] + (DESCRIPTION,) * (len(roles) - index)
+        return roles, " ".join(tokens[index:])
+
+    return roles, None
+
+
+def tag_amount(tokens, roles):
+    """
+    Tags the leading numbers as the amount. Returns the new roles and the amount.
+    A range such as "2 to 3" counts as its low bound
+    """
+    amount = 0
+    roles = list(roles)
+    live = [index for index, role in enumerate(roles) if role == NAME]
+    for position, index in enumerate(live):
+        word = tokens[index]
+
+        # "<amount> to <quantity>" is a range, tag the high bound as well
+        if word == "to" and position > 0:
+            high = live[position + 1 :]
+            size = 0
+            while size < len(high) and parse_quantity(tokens[high[size]]) is not None:
+                size += 1
+            if size:
+                for range_index in [index] + high[:size]:
+                    roles[range_index] = AMOUNT
             break
-    return ingredient, parsed_ingredient
 
+        # if word is digit or fraction, add it to the amount
+        quantity = parse_quantity(word)
+        if quantity is None:
+            break
+        amount += quantity
+        roles[index] = AMOUNT
+    return tuple(roles), amount
 
-def get_ingredient_unit(parsed_ingredient, ingredient):
-    # check words for unit
+
+def tag_unit(tokens, roles):
+    """
+    Tags the unit. Returns the new roles, the unit ("" if there is none, None on a
+    parsing error) and the amount added by "+" terms such as "1 cup + 2 tablespoons"
+    """
+    roles = list(roles)
+    live = [index for index, role in enumerate(roles) if role == NAME]
     unit_string = ""
-    for i in range(0, len(parsed_ingredient)):
-        plural_unit = in_checking_plurals(parsed_ingredient[i], MEASUREMENT_UNITS)
-        if plural_unit:
-            unit_string = plural_unit
-            del parsed_ingredient[i]
-
-            if i < len(parsed_ingredient) and parsed_ingredient[i] == "+":
-                while "+" in parsed_ingredient:
-                    index = parsed_ingredient.index("+")
-                    del parsed_ingredient[index]
-                    ingredient["amount"] += transformToCups(
-                        eval(parsed_ingredient[index]), parsed_ingredient[index + 1]
-                    )
-                    del parsed_ingredient[index]
-                    del parsed_ingredient[index + 1]
+    extra_amount = 0
 
-            break
+    # check words for unit
+    for position, index in enumerate(live):
+        plural_unit = in_checking_plurals(tokens[index], MEASUREMENT_LEXICON)
+        if not plural_unit:
+            continue
+        unit_string = plural_unit
+        roles[index] = UNIT
+
+        # add "+ <amount> <unit>" terms to the amount
+        rest = live[position + 1 :]
+        while len(rest) > 0 and tokens[rest[0]] == "+":
+            roles[rest[0]] = DROP
+            quantity = parse_quantity(tokens[rest[1]]) if len(rest) > 1 else None
+            if quantity is None:
+                break
+            roles[rest[1]] = AMOUNT
+            added_unit = ""
+            if len(rest) > 2:
+                added_unit = tokens[rest[2]]
+                roles[rest[2]] = DROP
+            extra_amount += transformToCups(
+                quantity, in_checking_plurals(added_unit, MEASUREMENT_LEXICON)
+            )
+            rest = rest[3:]
+        break
+
+    live = [index for index in live if roles[index] == NAME]
 
     # check for "cake" as unit, but only if "yeast" somewhere in ingredient
-    if "yeast" in parsed_ingredient:
-        for word in parsed_ingredient:
-            if equal_checking_plurals(word, "cakes"):
+    if any(tokens[index] == "yeast" for index in live):
+        for index in live:
+            if equal_checking_plurals(tokens[index], "cakes"):
                 unit_string = "cakes"
-                parsed_ingredient.remove(word)
+                roles[index] = UNIT
+                live.remove(index)
                 break
 
-    try:
-        # check if first word in array is "or", then ingredient has 2 possible units
-        if parsed_ingredient[0] == "or":
-            plural_unit = in_checking_plurals(parsed_ingredient[1], MEASUREMENT_UNITS)
-            if plural_unit:
-                unit_string += " " + parsed_ingredient[0] + " " + plural_unit
-                parsed_ingredient = parsed_ingredient[2:]
-    except IndexError:
-        print("Parsing error with: ", ingredient["index"], ingredient["title"])
-        return ingredient, parsed_ingredient
-
-    # delete "of" at first index, ie "1 cup of milk" -> "1 cup milk"
-    if parsed_ingredient[0] == "of":
-        del parsed_ingredient[0]
+    # check if first word is "or", then ingredient has 2 possible units
+    if not live or (tokens[live[0]] == "or" and len(live) < 2):
+        return tuple(roles), None, extra_amount
+    if tokens[live[0]] == "or":
+        plural_unit = in_checking_plurals(tokens[live[1]], MEASUREMENT_LEXICON)
+        if plural_unit:
+            unit_string += " or " + plural_unit
+            roles[live[0]] = roles[live[1]] = UNIT
+            live = live[2:]
 
-    ingredient["unit"] = unit_string
-    return ingredient, parsed_ingredient
+    # drop "of" at first index, ie "1 cup of milk" -> "1 cup milk"
+    if live and tokens[live[0]] == "of":
+        roles[live[0]] = DROP
 
+    return tuple(roles), unit_string, extra_amount
 
-def get_ingredient_descriptions(parsed_ingredient, ingredient):
-    # remove useless words
-    for word in parsed_ingredient:
-        if word in UNNECESSARY_DESCRIPTIONS:
-            parsed_ingredient.remove(word)
 
-    index = 0
-    while index < len(parsed_ingredient):
+def tag_descriptions(tokens, roles):
+    """
+    Tags descriptions (adjectives) and filler words. Returns the new roles, the
+    list of descriptions and whether any ingredient words were left
+    """
+    roles = list(roles)
+    descriptions = []
+
+    # drop useless words
+    for index, word in enumerate(tokens):
+        if roles[index] == NAME and word in UNNECESSARY_DESCRIPTION_LEXICON:
+            roles[index] = DROP
+
+    # the words are visited in order, "previous" and "next" are the neighbouring
+    # words that are still part of the ingredient name
+    live = [index for index, role in enumerate(roles) if role == NAME]
+    kept = []
+    for position, index in enumerate(live):
+        if roles[index] != NAME:
+            continue
+        word = tokens[index]
         description_string = ""
-        word = parsed_ingredient[index]
 
         # search through descriptions (adjectives)
-        if word in DESCRIPTIONS:
+        if word in DESCRIPTION_LEXICON:
             description_string = word
 
             # check previous word
-            if index > 0:
-                previous_word = parsed_ingredient[index - 1]
-                if previous_word in PRECEDING_ADVERBS or previous_word[-2:] == "ly":
+            if kept:
+                previous_word = tokens[kept[-1]]
+                if (
+                    previous_word in PRECEDING_ADVERB_LEXICON
+                    or previous_word[-2:] == "ly"
+                ):
                     description_string = previous_word + " " + word
-                    parsed_ingredient.remove(previous_word)
+                    roles[kept.pop()] = DESCRIPTION
 
             # check next word
-            elif index + 1 < len(parsed_ingredient):
-                next_word = parsed_ingredient[index + 1]
-                if next_word in SUCCEEDING_ADVERBS or next_word[-2:] == "ly":
+            elif position + 1 < len(live):
+                next_index = live[position + 1]
+                next_word = tokens[next_index]
+                if next_word in SUCCEEDING_ADVERB_LEXICON or next_word[-2:] == "ly":
                     description_string = word + " " + next_word
-                    parsed_ingredient.remove(next_word)
+                    roles[next_index] = DESCRIPTION
 
         # word not in descriptions, check if description with predecessor
-        elif word in DESCRIPTIONS_WITH_PREDECESSOR and index > 0:
-            description_string = parsed_ingredient[index - 1] + " " + word
-            del parsed_ingredient[index - 1]
+        elif word in DESCRIPTIONS_WITH_PREDECESSOR_LEXICON and kept:
+            description_string = tokens[kept[-1]] + " " + word
+            roles[kept.pop()] = DESCRIPTION
 
-        # either add description string to descriptions or check next word
+        # either add description string to descriptions or keep the word
         if description_string == "":
-            index += 1
+            kept.append(index)
         else:
-            ingredient["descriptions"].append(description_string)
-            parsed_ingredient.remove(word)
+            descriptions.append(description_string)
+            roles[index] = DESCRIPTION
 
-    # remove "and"
-    while "and" in parsed_ingredient:
-        parsed_ingredient.remove("and")
+    # drop "and" and "style"
+    for index in kept:
+        if tokens[index] in ("and", "style"):
+            roles[index] = DROP
+    kept = [index for index in kept if roles[index] == NAME]
 
-    # remove "style"
-    while "style" in parsed_ingredient:
-        parsed_ingredient.remove("style")
+    if not kept:
+        return tuple(roles), descriptions, False
 
-    try:
-        # remove "or" if last word
-        if parsed_ingredient[-1] == "or":
-            del parsed_ingredient[-1]
-    except IndexError:
-        print("Parsing error with: ", ingredient["index"], ingredient["title"])
-        return ingredient, parsed_ingredient
-    # replace hyphenated prefixes and suffixes
-    for word in parsed_ingredient:
-        for hypenated_suffix in HYPENATED_SUFFIXES:
-            if hypenated_suffix in word:
-                word = word.replace(hypenated_suffix, "-" + hypenated_suffix)
-
-        for hypenated_prefix in HYPENATED_PREFIXES:
-            if word.find(hypenated_prefix) == 0:
-                word = word.replace(hypenated_prefix, hypenated_prefix + "-")
+    # drop "or" if last word
+    if tokens[kept[-1]] == "or":
+        roles[kept.pop()] = DROP
 
     # move various nouns to description
-    if "powder" in parsed_ingredient and (
-        "coffee" in parsed_ingredient
-        or "espresso" in parsed_ingredient
-        or "tea" in parsed_ingredient
+    kept_words = {tokens[index] for index in kept}
+    if "powder" in kept_words and (
+        "coffee" in kept_words or "espresso" in kept_words or "tea" in kept_words
     ):
-        parsed_ingredient.remove("powder")
-        ingredient["descriptions"].append("unbrewed")
+        roles[next(index for index in kept if tokens[index] == "powder")] = DROP
+        descriptions.append("unbrewed")
 
-    return ingredient, parsed_ingredient
+    return tuple(roles), descriptions, True
 
 
-def get_ingredient(parsed_ingredient, ingredient):
-    ingredient_string = " ".join(parsed_ingredient)
+def get_ingredient_amount(parsed_ingredient, ingredient):
+    tokens = tuple(parsed_ingredient)
+    roles, ingredient["amount"] = tag_amount(tokens, (NAME,) * len(tokens))
+    return ingredient, words_with_role(tokens, roles)
 
-    # remove "*", add footnote to description
-    if "*" in ingredient_string:
-        ingredient["descriptions"].append("* see footnote")
-        ingredient_string = ingredient_string.replace("*", "")
 
-    # standardize "-" styling
-    ingredient_string = ingredient_string.replace("- ", "-")
-    ingredient_string = ingredient_string.replace(" -", "-")
-    ingredient_string = ingredient_string.replace("Jell O", "Jell-O")
-    ingredient_string = ingredient_string.replace("half half", "half-and-half")
+def get_ingredient_unit(parsed_ingredient, ingredient):
+    tokens = tuple(parsed_ingredient)
+    roles, unit_string, extra_amount = tag_unit(tokens, (NAME,) * len(tokens))
+    ingredient["amount"] += extra_amount
+    if unit_string is None:
+        ERROR_SINK.add(
+            UNIT_ERROR, ingredient["index"], ingredient["title"], " ".join(tokens)
+        )
+    else:
+        ingredient["unit"] = unit_string
+    return ingredient, words_with_role(tokens, roles)
 
-    # remove unnecessary punctuation
-    ingredient_string = ingredient_string.replace(".", "")
-    ingredient_string = ingredient_string.replace(";", "")
 
-    # fix spelling errors
-    ingredient_string = ingredient_string.replace("linguini", "linguine")
-    ingredient_string = ingredient_string.replace("filets", "fillets")
-    ingredient_string = ingredient_string.replace("chile", "chili")
-    ingredient_string = ingredient_string.replace("chiles", "chilis")
-    ingredient_string = ingredient_string.replace("chilies", "chilis")
-    ingredient_string = ingredient_string.replace("won ton", "wonton")
-    ingredient_string = ingredient_string.replace("liquer", "liqueur")
-    ingredient_string = ingredient_string.replace("confectioners ", "confectioners' ")
-    ingredient_string = ingredient_string.replace("creme de cacao", "chocolate liquer")
-    ingredient_string = ingredient_string.replace("pepperjack", "Pepper Jack")
-    ingredient_string = ingredient_string.replace("Pepper jack", "Pepper Jack")
+def get_ingredient_descriptions(parsed_ingredient, ingredient):
+    tokens = tuple(parsed_ingredient)
+    roles, descriptions, found = tag_descriptions(tokens, (NAME,) * len(tokens))
+    ingredient["descriptions"].extend(descriptions)
+    if not found:
+        ERROR_SINK.add(
+            NAME_ERROR, ingredient["index"], ingredient["title"], " ".join(tokens)
+        )
+    return ingredient, words_with_role(tokens, roles)
 
-    # standardize ingredient styling
-    ingredient_string = ingredient_string.replace("dressing mix", "dressing")
-    ingredient_string = ingredient_string.replace("salad dressing", "dressing")
-    ingredient_string = ingredient_string.replace("bourbon whiskey", "bourbon")
-    ingredient_string = ingredient_string.replace("pudding mix", "pudding")
-    ingredient_string = ingredient_string.replace("soup mix", "soup")
+
+def get_ingredient(parsed_ingredient, ingredient):
+    ingredient_string = " ".join(parsed_ingredient)
+
+    # add footnote to description, "*" itself is removed by the rewrite rules
+    if "*" in ingredient_string:
+        ingredient["descriptions"].append("* see footnote")
+    ingredient_string = INGREDIENT_NAME_REWRITER.apply(ingredient_string)
 
     # move flavors to description
     if " flavored " in ingredient_string:
@@ -278,6 +481,214 @@ def get_ingredient(parsed_ingredient, ingredient):
     return ingredient
 
 
+def parse_ingredient(recipe_index, recipe_title, ingredient_string):
+    """
+    Parses a single ingredient string, which must not be a separator. Lines that
+    were parsed before are served from PARSE_CACHE, lines that fail to parse are
+    added to ERROR_SINK
+    """
+    stats = STAGE_STATS
+    if stats is not None:
+        started = line_started = stats.clock()
+
+    # remove trademark symbols and "to taste", join "fluid ounce"
+    line = ingredient_string
+    ingredient_string = INGREDIENT_LINE_REWRITER.apply(ingredient_string)
+    if stats is not None:
+        started = stats.lap("parse_ingredient;rewrite_line", started)
+
+    unit, amount, name, descriptions, errors = PARSE_CACHE.get_or_parse(
+        ingredient_string, _parse_ingredient_string
+    )
+    if stats is not None:
+        stats.lap("parse_ingredient;parse", started)
+        stats.lap("parse_ingredient", line_started)
+    for kind in errors:
+        ERROR_SINK.add(kind, recipe_index, recipe_title, line)
+
+    return {
+        "title": recipe_title,
+        "descriptions": list(descriptions),
+        "index": recipe_index,
+        "unit": unit,
+        "amount": amount,
+        "ingredient": name,
+    }
+
+
+def parser_fingerprint():
+    """
+    Returns a fingerprint of the rule parser, derived from its lookup tables and
+    PARSER_VERSION, used to invalidate persistent caches when the rules change
+    """
+    return fingerprint(
+        PARSER_VERSION,
+        MEASUREMENT_UNITS,
+        CONTAINERS,
+        DESCRIPTIONS,
+        PRECEDING_ADVERBS,
+        SUCCEEDING_ADVERBS,
+        PREPOSITIONS,
+        DESCRIPTIONS_WITH_PREDECESSOR,
+        UNNECESSARY_DESCRIPTIONS,
+        PARENTHESES_REGEX.pattern,
+        VULGAR_FRACTIONS,
+        QUANTITY_REGEX.pattern,
+        QUANTITY_RANGE_REGEX.pattern,
+        UNITS,
+        CUP_RATIOS,
+        INGREDIENT_LINE_REWRITES,
+        SEPARATOR_REWRITES,
+        INGREDIENT_NAME_REWRITES,
+    )
+
+
+def open_parse_store(path):
+    """
+    Opens (or creates) an sqlite cache of parsed lines at path and puts it behind
+    PARSE_CACHE, so lines parsed in earlier runs are not parsed again. Entries
+    of other rule versions are ignored. Close the returned store when done
+    """
+    store = SQLiteParseCache(
+        path, "rules", parser_fingerprint(), decode=_decode_ingredient_record
+    )
+    PARSE_CACHE.store = store
+    return store
+
+
+def _spell_out_range(match):
+    """
+    Replaces the dash of a leading quantity range with "to", i.e. "2-3" becomes
+    "2 to 3", unless the bounds do not make a range, i.e. "1-1/2"
+    """
+    low = [parse_quantity(word) for word in match.group("low").split()]
+    high = parse_quantity(match.group("high"))
+    if None in low or high is None or high <= sum(low):
+        return match.group()
+    return "{} to {}".format(match.group("low"), match.group("high"))
+
+
+def _decode_ingredient_record(record):
+    unit, amount, name, descriptions, errors = record
+    return unit, amount, name, tuple(descriptions), tuple(errors)
+
+
+def _parse_ingredient_string(ingredient_string):
+    """
+    Parses an ingredient string that went through INGREDIENT_LINE_REWRITER.
+    Returns an immutable (unit, amount, ingredient, descriptions, errors) record,
+    where errors is the tuple of the kinds of the stages that failed
+    """
+    ingredient = {}
+    ingredient["descriptions"] = []
+    ingredient["unit"] = None
+    errors = ()
+
+    stats = STAGE_STATS
+    if stats is not None:
+        started = stats.clock()
+
+    # move parentheses to description
+    while True:
+        parentheses = PARENTHESES_REGEX.search(ingredient_string)
+        if not parentheses:
+            break
+        search_string = parentheses.group()
+        ingredient_string = ingredient_string.replace(search_string, "")
+        ingredient["descriptions"].append(search_string[1:-1])
+    if stats is not None:
+        started = stats.lap("parse_ingredient;parse;parentheses", started)
+
+    # spell out the dash of a leading range, then remove "," and "-" and split
+    # ingredient into words, every word starts as
+    # part of the name and the stages below tag the other roles
+    ingredient_string = QUANTITY_RANGE_REGEX.sub(_spell_out_range, ingredient_string, 1)
+    ingredient_string = SEPARATOR_REWRITER.apply(ingredient_string)
+    tokens = split_ingredient_words(ingredient_string)
+    roles = (NAME,) * len(tokens)
+    if stats is not None:
+        count = len(tokens)
+        started = stats.lap("parse_ingredient;parse;split", started, count)
+
+    # move prepositions to description
+    roles, prepositional_phrase = tag_prepositions(tokens, roles)
+    if prepositional_phrase is not None:
+        ingredient["descriptions"].append(prepositional_phrase)
+    if stats is not None:
+        started = stats.lap("parse_ingredient;parse;prepositions", started, count)
+
+    # get ingredient amount
+    roles, ingredient["amount"] = tag_amount(tokens, roles)
+    if stats is not None:
+        started = stats.lap("parse_ingredient;parse;amount", started, count)
+
+    # get ingredient unit
+    roles, unit_string, extra_amount = tag_unit(tokens, roles)
+    ingredient["amount"] += extra_amount
+    if unit_string is None:
+        errors += (UNIT_ERROR,)
+    else:
+        ingredient["unit"] = unit_string
+    if stats is not None:
+        started = stats.lap("parse_ingredient;parse;unit", started, count)
+
+    # get ingredient descriptions
+    roles, descriptions, found = tag_descriptions(tokens, roles)
+    ingredient["descriptions"].extend(descriptions)
+    if not found:
+        errors += (NAME_ERROR,)
+    if stats is not None:
+        started = stats.lap("parse_ingredient;parse;descriptions", started, count)
+
+    # get ingredient
+    ingredient = get_ingredient(words_with_role(tokens, roles), ingredient)
+    if stats is not None:
+        started = stats.lap("parse_ingredient;parse;get_ingredient", started, count)
+
+    # expand containers whose size is given, i.e. "2 (16 ounce) cans"
+    if ingredient["unit"] in CONTAINER_LEXICON:
+        for idx, desc in enumerate(ingredient["descriptions"]):
+            desc = desc.split()
+            if len(desc) == 2:
+                plural_unit = in_checking_plurals(desc[1], MEASUREMENT_LEXICON)
+                quantity = parse_quantity(desc[0])
+                if plural_unit and quantity is not None:
+                    ingredient["unit"] = plural_unit
+                    ingredient["amount"] *= quantity
+                    del ingredient["descriptions"][idx]
+                    break
+    if stats is not None:
+        stats.lap("parse_ingredient;parse;containers", started)
+
+    return (
+        ingredient["unit"],
+        ingredient["amount"],
+        ingredient["ingredient"],
+        tuple(ingredient["descriptions"]),
+        errors,
+    )
+
+
+@contextmanager
+def collect_stage_stats(stats=None):
+    """
+    Records the time, calls and tokens of every parsing stage while the block
+    runs, in stats or a new StageStats, which is returned. Only parsing done in
+    this process is recorded; without it the stages are not timed at all.
+
+        with collect_stage_stats() as stats:
+            parse_ingredient_list(0, "title", ingredients)
+        stats.write_collapsed(open("parse.folded", "w"))
+    """
+    global STAGE_STATS
+    previous = STAGE_STATS
+    STAGE_STATS = StageStats() if stats is None else stats
+    try:
+        yield STAGE_STATS
+    finally:
+        STAGE_STATS = previous
+
+
 def parse_ingredient_list(recipe_index, recipe_title, ingredient_list):
     if isinstance(ingredient_list, list):
         ingredients = []
@@ -287,91 +698,9 @@ def parse_ingredient_list(recipe_index, recipe_title, ingredient_list):
             if is_seperator(ingredient_string):
                 continue
 
-            ingredient = {}
-            ingredient["title"] = recipe_title
-            ingredient["descriptions"] = []
-            ingredient["index"] = recipe_index
-            ingredient["unit"] = None
-
-            # remove trademark symbols
-            ingredient_string = ingredient_string.replace("\u00ae", "")
-            ingredient_string = ingredient_string.replace("(TM)", "")
-            ingredient_string = ingredient_string.replace("™", "")
-
-            # convert fluid ouces to one token
-            ingredient_string = ingredient_string.replace("fluid ounce", "fluid_ounce")
-
-            # remove "or more to taste"
-            ingredient_string = ingredient_string.replace("or more to taste", "")
-            ingredient_string = ingredient_string.replace("or to taste", "")
-            ingredient_string = ingredient_string.replace("to taste", "")
-
-            # move parentheses to description
-            while True:
-                parentheses = PARENTHESES_REGEX.search(ingredient_string)
-                if not parentheses:
-                    break
-                search_string = parentheses.group()
-                ingredient_string = ingredient_string.replace(search_string, "")
-                ingredient["descriptions"].append(search_string[1:-1])
-
-            # remove "," and "-" then split ingredient into words
-            ingredient_string = ingredient_string.replace(",", " and ")
-            ingredient_string = ingredient_string.replace("-", " ")
-            parsed_ingredient = ingredient_string.split(" ")
-
-            # remove "", caused by extra spaces
-            while "" in parsed_ingredient:
-                parsed_ingredient.remove("")
-
-            # move prepositions to description
-            for index in range(0, len(parsed_ingredient)):
-                if parsed_ingredient[index] in PREPOSITIONS:
-                    if (
-                        index + 1 < len(parsed_ingredient)
-                        and parsed_ingredient[index + 1] == "use"
-                    ) or (
-                        index > 0
-                        and parsed_ingredient[index - 1] == "bone"
-                        and parsed_ingredient[index] == "in"
-                    ):
-                        continue
-
-                    parsed_prepositional_phrase = parsed_ingredient[index:]
-                    ingredient["descriptions"].append(
-                        " ".join(parsed_prepositional_phrase)
-                    )
-                    parsed_ingredient = parsed_ingredient[:index]
-                    break
-
-            # get ingredient amount
-            ingredient, parsed_ingredient = get_ingredient_amount(
-                parsed_ingredient, ingredient
+            ingredients.append(
+                parse_ingredient(recipe_index, recipe_title, ingredient_string)
             )
-
-            # get ingredient unit
-            ingredient, parsed_ingredient = get_ingredient_unit(
-                parsed_ingredient, ingredient
-            )
-
-            # get ingredient descriptions
-            ingredient, parsed_ingredient = get_ingredient_descriptions(
-                parsed_ingredient, ingredient
-            )
-
-            # get ingredient
-            ingredient = get_ingredient(parsed_ingredient, ingredient)
-            ingredients.append(ingredient)
-
-            if ingredient["unit"] in CONTAINERS and ingredient["descriptions"]:
-                for idx, desc in enumerate(ingredient["descriptions"]):
-                    desc = desc.split()
-                    if len(desc) == 2:
-                        plural_unit = in_checking_plurals(desc[1], MEASUREMENT_UNITS)
-                        if plural_unit and any(i.isdigit() for i in desc[0]):
-                            ingredient["unit"] = plural_unit
-                            ingredient["amount"] *= eval(desc[0])
-                            del ingredient["descriptions"][idx]
         return ingredients
     else:
         return recipe_index, recipe_title, None
@@ -670,3 +999,119 @@ HYPENATED_SUFFIXES = ["coated", "free", "flavored"]
 
 PARENTHESES_REGEX = re.compile(r"\([^()]*\)")
 
+# unicode vulgar fractions and their values
+VULGAR_FRACTIONS = {
+    "½": Fraction(1, 2),
+    "⅓": Fraction(1, 3),
+    "⅔": Fraction(2, 3),
+    "¼": Fraction(1, 4),
+    "¾": Fraction(3, 4),
+    "⅕": Fraction(1, 5),
+    "⅖": Fraction(2, 5),
+    "⅗": Fraction(3, 5),
+    "⅘": Fraction(4, 5),
+    "⅙": Fraction(1, 6),
+    "⅚": Fraction(5, 6),
+    "⅐": Fraction(1, 7),
+    "⅛": Fraction(1, 8),
+    "⅜": Fraction(3, 8),
+    "⅝": Fraction(5, 8),
+    "⅞": Fraction(7, 8),
+    "⅑": Fraction(1, 9),
+    "⅒": Fraction(1, 10),
+}
+
+# integers, decimals, "1/2", "1 1/2", "½" and "1½" ("⁄" is the fraction slash)
+QUANTITY_REGEX = re.compile(
+    r"(?:(?P<whole>\d+)\s+)?(?P<numerator>\d+)[/⁄](?P<denominator>\d+)"
+    r"|(?P<whole_vulgar>\d+)?\s*(?P<vulgar>[{}])"
+    r"|(?P<decimal>\d+\.\d*|\.\d+)"
+    r"|(?P<integer>\d+)".format("".join(VULGAR_FRACTIONS))
+)
+QUANTITY_START_CHARACTERS = frozenset("0123456789.").union(VULGAR_FRACTIONS)
+
+# a leading quantity range with a dash, i.e. "2-3", "2 - 3" or "1 1/2-2"
+QUANTITY_RANGE_REGEX = re.compile(
+    r"^(?P<low>\s*[\d.\s/⁄{0}]*[\d{0}])\s*[-–—]\s*"
+    r"(?P<high>[\d.{0}][\d./⁄{0}]*)".format("".join(VULGAR_FRACTIONS))
+)
+
+# (old, new) replacements applied in order to a raw ingredient line
+INGREDIENT_LINE_REWRITES = [
+    # remove trademark symbols
+    ("\u00ae", ""),
+    ("(TM)", ""),
+    ("™", ""),
+    # convert fluid ouces to one token
+    ("fluid ounce", "fluid_ounce"),
+    # remove "or more to taste"
+    ("or more to taste", ""),
+    ("or to taste", ""),
+    ("to taste", ""),
+]
+
+# (old, new) replacements applied before splitting an ingredient line into words
+SEPARATOR_REWRITES = [(",", " and "), ("-", " ")]
+
+# (old, new) replacements applied in order to the ingredient name
+INGREDIENT_NAME_REWRITES = [
+    # remove "*", the footnote is kept in the descriptions
+    ("*", ""),
+    # standardize "-" styling
+    ("- ", "-"),
+    (" -", "-"),
+    ("Jell O", "Jell-O"),
+    ("half half", "half-and-half"),
+    # remove unnecessary punctuation
+    (".", ""),
+    (";", ""),
+    # fix spelling errors
+    ("linguini", "linguine"),
+    ("filets", "fillets"),
+    ("chile", "chili"),
+    ("chiles", "chilis"),
+    ("chilies", "chilis"),
+    ("won ton", "wonton"),
+    ("liquer", "liqueur"),
+    ("confectioners ", "confectioners' "),
+    ("creme de cacao", "chocolate liquer"),
+    ("pepperjack", "Pepper Jack"),
+    ("Pepper jack", "Pepper Jack"),
+    # standardize ingredient styling
+    ("dressing mix", "dressing"),
+    ("salad dressing", "dressing"),
+    ("bourbon whiskey", "bourbon"),
+    ("pudding mix", "pudding"),
+    ("soup mix", "soup"),
+]
+
+# when True, every rewrite is checked against applying the rules one by one
+VERIFY_REWRITES = False
+
+# precompiled lexicons of the lookup lists above, used by the parser hot path
+MEASUREMENT_LEXICON = Lexicon(MEASUREMENT_UNITS)
+CONTAINER_LEXICON = Lexicon(CONTAINERS)
+DESCRIPTION_LEXICON = Lexicon(DESCRIPTIONS)
+PRECEDING_ADVERB_LEXICON = Lexicon(PRECEDING_ADVERBS)
+SUCCEEDING_ADVERB_LEXICON = Lexicon(SUCCEEDING_ADVERBS)
+PREPOSITION_LEXICON = Lexicon(PREPOSITIONS)
+DESCRIPTIONS_WITH_PREDECESSOR_LEXICON = Lexicon(DESCRIPTIONS_WITH_PREDECESSOR)
+UNNECESSARY_DESCRIPTION_LEXICON = Lexicon(UNNECESSARY_DESCRIPTIONS)
+
+# rewrite tables
+INGREDIENT_LINE_REWRITER = Rewriter(INGREDIENT_LINE_REWRITES)
+SEPARATOR_REWRITER = Rewriter(SEPARATOR_REWRITES)
+INGREDIENT_NAME_REWRITER = Rewriter(INGREDIENT_NAME_REWRITES)
+
+# version of the parsing stages, bump it when a change to them alters results
+PARSER_VERSION = 4
+
+# parsed ingredient lines, resize or switch off with PARSE_CACHE.configure()
+PARSE_CACHE = LRUCache(maxsize=65536)
+
+# parse errors, counted by kind with sampled examples, see ErrorSink
+ERROR_SINK = ErrorSink()
+
+# set by collect_stage_stats, the parsing stages are timed while it is not None
+STAGE_STATS = None
+
@@ -3,6 +3,35 @@ import re
 import string
 
 
+AMERICAN_UNITS = ['cup', 'tablespoon', 'teaspoon', 'pound', 'ounce', 'quart', 'pint']
+
+# an American unit followed by a slash, or a quantity with a fractional part
+# (see clumpFractions). Both need a slash and never overlap, so one pass
+# rewrites both
+TOKENIZE_REGEX = re.compile(
+    r'(?P<unit>(?:%s)s?)/|(\d+)\s+(\d)/(\d)' % '|'.join(AMERICAN_UNITS))
+
+SPLIT_REGEX = re.compile(r'([,\(\)])?\s+')
+
+# unicode fraction -> its ascii representation, preceded by a space
+UNICODE_FRACTIONS = str.maketrans({
+    u'\u215b': ' 1/8',
+    u'\u215c': ' 3/8',
+    u'\u215d': ' 5/8',
+    u'\u215e': ' 7/8',
+    u'\u2159': ' 1/6',
+    u'\u215a': ' 5/6',
+    u'\u2155': ' 1/5',
+    u'\u2156': ' 2/5',
+    u'\u2157': ' 3/5',
+    u'\u2158': ' 4/5',
+    u'\xbc': '  1/4',
+    u'\xbe': ' 3/4',
+    u'\u2153': ' 1/3',
+    u'\u2154': ' 2/3',
+    u'\xbd': ' 1/2',
+})
+
 def tokenize(s):
     """
     Tokenize on parenthesis, punctuation, spaces and American units followed by a slash.
@@ -15,12 +44,16 @@ def tokenize(s):
     But we must split the text on "cups/" etc. in order to pick it up.
     """
 
-    american_units = ['cup', 'tablespoon', 'teaspoon', 'pound', 'ounce', 'quart', 'pint']
-    for unit in american_units:
-        s = s.replace(unit + '/', unit + ' ')
-        s = s.replace(unit + 's/', unit + 's ')
+    if '/' in s:
+        s = TOKENIZE_REGEX.sub(_tokenizeReplacement, s)
+
+    return list(filter(None, SPLIT_REGEX.split(s)))
 
-    return list(filter(None, re.split(r'([,\(\)])?\s+', clumpFractions(s))))
+def _tokenizeReplacement(match):
+    unit = match.group('unit')
+    if unit is not None:
+        return unit + ' '
+    return '%s$%s/%s' % match.group(2, 3, 4)
 
 def joinLine(columns):
     return "\t".join(columns)
@@ -41,31 +74,11 @@ def cleanUnicodeFractions(s):
     Replace unicode fractions with ascii representation, preceded by a
     space.
 
-    "1\x215e" => "1 7/8"
-    """
-
-    fractions = {
-        u'\x215b': '1/8',
-        u'\x215c': '3/8',
-        u'\x215d': '5/8',
-        u'\x215e': '7/8',
-        u'\x2159': '1/6',
-        u'\x215a': '5/6',
-        u'\x2155': '1/5',
-        u'\x2156': '2/5',
-        u'\x2157': '3/5',
-        u'\x2158': '4/5',
-        u'\xbc': ' 1/4',
-        u'\xbe': '3/4',
-        u'\x2153': '1/3',
-        u'\x2154': '2/3',
-        u'\xbd': '1/2',
-    }
-
-    for f_unicode, f_ascii in fractions.items():
-        s = s.replace(f_unicode, ' ' + f_ascii)
-
-    return s
+    "1\u215e" => "1 7/8"
+    """
+    if s.isascii():
+        return s
+    return s.translate(UNICODE_FRACTIONS)
 
 def unclump(s):
     """
@@ -91,9 +104,44 @@ def getFeatures(token, index, tokens):
         ("I%s" % index),
         ("L%s" % lengthGroup(length)),
         ("Yes" if isCapitalized(token) else "No") + "CAP",
-        ("Yes" if insideParenthesis(token, tokens) else "No") + "PAREN"
+        ("Yes" if insideParenthesisAt(index - 1, tokens) else "No") + "PAREN"
     ]
 
+def getSentenceFeatures(tokens):
+    """
+    Returns the list of features of every token of a sentence, the same as
+    calling getFeatures for each token, in one pass over the sentence.
+    """
+    length = len(tokens)
+    lengthFeature = "L%s" % lengthGroup(length)
+
+    # closeAfter[i] is true if a ")" comes after token i
+    closeAfter = [False] * length
+    seenClose = False
+    for i in range(length - 1, -1, -1):
+        closeAfter[i] = seenClose
+        seenClose = seenClose or ")" in tokens[i]
+
+    features = []
+    openBefore = False
+    for i, token in enumerate(tokens):
+        inside = token in ("(", ")") or (openBefore and closeAfter[i])
+        features.append([
+            "I%s" % (i + 1),
+            lengthFeature,
+            ("Yes" if "A" <= token[:1] <= "Z" else "No") + "CAP",
+            ("Yes" if inside else "No") + "PAREN"
+        ])
+        openBefore = openBefore or "(" in token
+
+    return features
+
+def getCorpusFeatures(sentences):
+    """
+    Returns the features of every sentence of a list of tokenized sentences.
+    """
+    return [getSentenceFeatures(tokens) for tokens in sentences]
+
 def singularize(word):
     """
     A poor replacement for the pattern.en singularize function, but ok for now.
@@ -148,9 +196,21 @@ def lengthGroup(actualLength):
 
     return "X"
 
+def insideParenthesisAt(position, tokens):
+    """
+    Returns true if the token at position (counting from 0) is inside
+    parenthesis in the phrase, i.e. it is a parenthesis or a "(" comes before it
+    and a ")" after it.
+    """
+    if tokens[position] in ['(', ')']:
+        return True
+    return (any("(" in token for token in tokens[:position])
+            and any(")" in token for token in tokens[position + 1:]))
+
 def insideParenthesis(token, tokens):
     """
-    Returns true if the word is inside parenthesis in the phrase.
+    Returns true if the word is inside parenthesis in the phrase. This looks at
+    any occurrence of the word, use insideParenthesisAt for a given position.
     """
     if token in ['(', ')']:
         return True
@@ -197,8 +257,17 @@ def import_data(lines):
     This thing takes the output of CRF++ and turns it into an actual
     data structure.
     """
-    data = [{}]
-    display = [[]]
+    return list(iter_import_data(lines))
+
+
+def iter_import_data(lines):
+    """
+    Yields the ingredients of the output of CRF++ one at a time, as soon as
+    the blank line that ends each of them is read. lines can be an open file,
+    only the current ingredient is kept in memory.
+    """
+    data = {}
+    display = []
     prevTag = None
     #
     # iterate lines in the data file, which looks like:
@@ -224,9 +293,11 @@ def import_data(lines):
     #
     for line in lines:
         # blank line starts a new ingredient
-        if line in ('', '\n'):
-            data.append({})
-            display.append([])
+        if line in ('', '\n', '\r\n'):
+            if data:
+                yield finishIngredient(data, display)
+            data = {}
+            display = []
             prevTag = None
 
         # ignore comments
@@ -237,70 +308,92 @@ def import_data(lines):
         # e.g.: potato \t I2 \t L5 \t NoCAP \t B-NAME/0.978253
         else:
 
-            columns = re.split('\t', line.strip())
+            columns = line.strip().split('\t')
             token = columns[0].strip()
 
             # unclump fractions
             token = unclump(token)
 
             # turn B-NAME/123 back into "name"
-            tag, confidence = re.split(r'/', columns[-1], 1)
-            tag = re.sub('^[BI]\-', "", tag).lower()
+            tag, confidence = columns[-1].split('/', 1)
+            if tag[:2] in ('B-', 'I-'):
+                tag = tag[2:]
+            tag = tag.lower()
 
             # ---- DISPLAY ----
             # build a structure which groups each token by its tag, so we can
             # rebuild the original display name later.
 
             if prevTag != tag:
-                display[-1].append((tag, [token]))
+                display.append((tag, [token]))
                 prevTag = tag
 
             else:
-                display[-1][-1][1].append(token)
-                #               ^- token
-                #            ^---- tag
-                #        ^-------- ingredient
+                display[-1][1].append(token)
+                #           ^- token
+                #        ^---- tag
 
             # ---- DATA ----
             # build a dict grouping tokens by their tag
 
             # initialize this attribute if this is the first token of its kind
-            if tag not in data[-1]:
-                data[-1][tag] = []
+            if tag not in data:
+                data[tag] = []
 
             # HACK: If this token is a unit, singularize it so Scoop accepts it.
             if tag == "unit":
                 token = singularize(token)
 
-            data[-1][tag].append(token)
+            data[tag].append(token)
+
+    if data:
+        yield finishIngredient(data, display)
+
+
+def finishIngredient(data, display):
+    """
+    Assembles the dict of an ingredient from its tokens grouped by tag and its
+    list of (tag, [tokens]) tuples.
+    """
+    output = dict([(k, smartJoin(tokens)) for k, tokens in data.items()])
 
-    # reassemble the output into a list of dicts.
-    output = [
-        dict([(k, smartJoin(tokens)) for k, tokens in ingredient.iteritems()])
-        for ingredient in data
-        if len(ingredient)
-        ]
     # Add the marked-up display data
-    for i, v in enumerate(output):
-        output[i]["display"] = displayIngredient(display[i])
+    output["display"] = displayIngredient(display)
 
     # Add the raw ingredient phrase
-    for i, v in enumerate(output):
-        output[i]["input"] = smartJoin(
-            [" ".join(tokens) for k, tokens in display[i]])
+    output["input"] = smartJoin([" ".join(tokens) for k, tokens in display])
 
     return output
 
 
 def export_data(lines):
     """ Parse "raw" ingredient lines into CRF-ready output """
-    output = []
-    for line in lines:
-        line_clean = re.sub('<[^<]+?>', '', line)
-        tokens = tokenize(line_clean)
-
-        for i, token in enumerate(tokens):
-            features = getFeatures(token, i+1, tokens)
-            output.append(joinLine([token] + features))
-        output.append('')
-    return '\n'.join(output)
+    return '\n'.join(export_line(line) for line in lines)
+
+
+def export_line(line):
+    """
+    Returns the CRF-ready output of one "raw" ingredient line, one token per
+    line, each ending with a newline.
+    """
+    line_clean = re.sub('<[^<]+?>', '', line)
+    tokens = tokenize(line_clean)
+
+    return "".join(
+        joinLine([token] + features) + '\n'
+        for token, features in zip(tokens, getSentenceFeatures(tokens))
+    )
+
+
+def write_export_data(lines, output):
+    """
+    Writes the CRF-ready output of "raw" ingredient lines to a file object as
+    they are read, the same text as export_data without building it in memory.
+    Returns the number of lines written.
+    """
+    count = 0
+    for count, block in enumerate(map(export_line, lines), 1):
+        if count > 1:
+            output.write('\n')
+        output.write(block)
+    return count